@@ -1,13 +1,19 @@
 import dash
+import flask
 import dash_bootstrap_components as dbc
 from dash import html, dcc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
+from dash.exceptions import PreventUpdate
 import plotly.graph_objects as go
-from data_load import states, airports, area_centers, aircraft_operators, aircraft_operators_2019
+import data_load
+import figure_cache
+import fast_figures
 import calculations
 import constants as c
 
+import os
 import json
+import functools
 
 app = dash.Dash(
     __name__,
@@ -20,12 +26,69 @@ app = dash.Dash(
     ]
 )
 
-with open('assets/custom_map.json') as file:
-    countries = json.load(file)
-
 app.title = 'European Air Traffic Dashboard'
 server = app.server
 
+# Figures are built as plain dictionaries with FAST_FIGURES=1
+if fast_figures.FAST_FIGURES:
+    go = fast_figures
+
+# Geometry of the states map is served once as a static asset and the map
+# figures refer to it by url, so callbacks send only codes and values.
+# MAP_GEOJSON=inline embeds the geometry in every figure instead
+MAP_GEOJSON_INLINE = os.environ.get('MAP_GEOJSON', 'url') == 'inline'
+MAP_ZOOM = 2
+
+# Simplified variants of the geometry (see build_map_geometry.py) and the
+# largest zoom each of them is detailed enough for, the full geometry
+# is used above them
+MAP_GEOMETRY_LEVELS = [(3, 'low'), (5, 'medium'), (8, 'high')]
+MAP_GEOMETRY_PATH = 'assets/custom_map.json'
+
+
+def get_map_geometry_path(zoom):
+    for max_zoom, level in MAP_GEOMETRY_LEVELS:
+        path = MAP_GEOMETRY_PATH.replace('.json', '_{}.json'.format(level))
+        if zoom <= max_zoom and os.path.exists(path):
+            return path
+    return MAP_GEOMETRY_PATH
+
+
+@functools.lru_cache(maxsize=None)
+def load_map_geometry(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def get_map_geometry(zoom):
+    """
+    Returns geometry of the states map detailed enough for a zoom,
+    a url of the asset changing with the file or the geometry itself
+    """
+    path = get_map_geometry_path(zoom)
+    if MAP_GEOJSON_INLINE:
+        return load_map_geometry(path)
+    return '{}?v={}'.format(
+        app.get_asset_url(os.path.basename(path)),
+        int(os.path.getmtime(path))
+    )
+
+
+@server.after_request
+def cache_map_geometry(response):
+    """
+    Urls of the map geometry change with the files,
+    so browsers can keep them for a year
+    """
+    path = flask.request.path
+    if (path.startswith(app.get_asset_url('custom_map')) and path.endswith('.json') and
+            flask.request.args.get('v')):
+        response.cache_control.public = True
+        response.cache_control.max_age = 365 * 24 * 60 * 60
+        response.cache_control.no_cache = None
+    return response
+
+
 # we use the Row and Col components to construct the sidebar header
 # it consists of a title, and a toggle, the latter is hidden on large screens
 sidebar_header = dbc.Row(
@@ -88,9 +151,6 @@ sidebar = html.Div(
                     dbc.Col(
                         dcc.Dropdown(
                             id='states_list',
-                            options=[
-                                {'label': x, 'value': x} for x in calculations.get_unique_values(states, c.ENTITY)
-                            ],
                             multi=True,
                             clearable=True,
                             placeholder='Select States',
@@ -124,9 +184,6 @@ sidebar = html.Div(
                     dbc.Col(
                         dcc.Dropdown(
                             id='aircraft_operator_list',
-                            options=[
-                                {'label': x, 'value': x} for x in calculations.get_unique_values(aircraft_operators, c.ENTITY)
-                            ],
                             multi=True,
                             clearable=True,
                             placeholder='Select Aircraft Operators',
@@ -459,31 +516,93 @@ content = html.Div(children=[
 )
 
 
-app.layout = html.Div([sidebar, content])
+# Dataset which defines the date range of each tab
+TAB_DATASETS = {
+    'state_traffic_tab': 'states',
+    'airport_traffic_tab': 'airports',
+    'aircraft_operator_tab': 'aircraft_operators'
+}
+
+
+def get_date_ranges():
+    """
+    Returns first and last date of each tab and the day after the last
+    one, used by the date pickers in the browser. Dates are read from the
+    dataset cache (see data_load.get_date_range), datasets are not loaded.
+    Tabs whose dates are not known get them when they are opened
+    (see update_date_ranges)
+    """
+    date_ranges = {}
+    for tab, name in TAB_DATASETS.items():
+        date_range = data_load.get_date_range(name)
+        if date_range is not None:
+            date_ranges[tab] = calculations.get_date_picker_range(*date_range)
+    return date_ranges
+
+
+def build_layout():
+    return html.Div([
+        sidebar,
+        content,
+        dcc.Store(id='date_ranges', data=get_date_ranges()),
+        dcc.Store(id='date_range_request')
+    ])
+
+
+app.layout = build_layout()
+
+
+@server.before_request
+def apply_queued_appends():
+    """
+    Appends rows queued by append_dataset.py to the datasets of this
+    process (see data_load.check_queued_appends), the layout is built
+    again with the extended date ranges
+    """
+    if data_load.check_queued_appends():
+        app.layout = build_layout()
+
+
+def check_active_tab(tab, expected_tab):
+    """
+    Stops an update of a component which is not on the selected tab,
+    so that the datasets of a tab are loaded only once the tab is opened
+    """
+    if tab != expected_tab:
+        raise PreventUpdate
+
+
+def get_zoom(relayout_data):
+    """
+    Returns the x range of a zoomed time series chart when the zoom triggers
+    the update, other inputs (dates, filters) show their whole period.
+    Stops an update triggered by a change of the chart which keeps its
+    x axis (e.g. resizing), the figure is the same
+    """
+    if relayout_data is None or not figure_cache.is_zoom_update():
+        return None
+    if not any(key.startswith('xaxis.') for key in relayout_data):
+        raise PreventUpdate
+    return calculations.get_x_range(relayout_data)
+
 
 # ---- Callbacks for controls ----- #
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='toggle_classname'),
     Output("sidebar", "className"),
     [Input("sidebar-toggle", "n_clicks")],
     [State("sidebar", "className")],
 )
-def toggle_classname(n, classname):
-    if n and classname == "collapsed":
-        return ""
-    return "collapsed"
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='toggle_collapse'),
     Output("collapse", "is_open"),
     [Input("navbar-toggle", "n_clicks")],
     [State("collapse", "is_open")],
 )
-def toggle_collapse(n, is_open):
-    if n:
-        return not is_open
-    return is_open
 
 
 @app.callback(
@@ -493,11 +612,13 @@ def toggle_collapse(n, is_open):
 )
 def update_states_list(tab, list_of_airports):
     if tab == 'state_traffic_tab':
+        states = data_load.get_dataset('states')
         filtered_data = states[
             states[c.ENTITY].ne(c.TOT_NETWORK_AREA)
         ]
         return [{'label': x, 'value': x} for x in calculations.get_unique_values(filtered_data, c.ENTITY)]
     elif tab == 'airport_traffic_tab':
+        airports = data_load.get_dataset('airports')
         if list_of_airports:
             filtered_data = calculations.filter_airport_dataset(
                 data=airports,
@@ -507,31 +628,33 @@ def update_states_list(tab, list_of_airports):
         else:
             return [{'label': x, 'value': x} for x in calculations.get_unique_values(airports, c.STATE_NAME)]
     else:
-        return [{'label': x, 'value': x} for x in calculations.get_unique_values(states, c.ENTITY)]
+        # states list is disabled on other tabs
+        raise PreventUpdate
 
 
 
 @app.callback(
     Output('airport_list', 'options'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
 )
-def update_airport_list(list_of_states):
+def update_airport_list(tab, list_of_states):
+    check_active_tab(tab, 'airport_traffic_tab')
+    airports = data_load.get_dataset('airport_dimensions')
     if list_of_states:
-        filtered_data = calculations.filter_airport_dataset(
-            data=airports,
-            states=list_of_states
-        )
-        return [{'label': x, 'value': x} for x in calculations.get_unique_values(filtered_data, c.AIRPORT_NAME)]
-    else:
-        return [{'label': x, 'value': x} for x in calculations.get_unique_values(airports, c.AIRPORT_NAME)]
+        airports = airports[airports[c.STATE_NAME].isin(list_of_states)]
+    return [{'label': x, 'value': x} for x in calculations.get_unique_values(airports, c.AIRPORT_NAME)]
 
 
 
 @app.callback(
     Output('acc_list', 'options'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value')
 )
-def update_acc_list(list_of_states):
+def update_acc_list(tab, list_of_states):
+    check_active_tab(tab, 'state_traffic_tab')
+    area_centers = data_load.get_dataset('area_centers')
     if list_of_states:
         filtered_data = calculations.filter_area_center_data(
             data=area_centers,
@@ -544,99 +667,79 @@ def update_acc_list(list_of_states):
 
 
 @app.callback(
-    Output('ifr_movements', 'options'),
-    Output('ifr_movements', 'value'),
+    Output('aircraft_operator_list', 'options'),
     Input('content_tabs', 'value')
 )
-def update_airport_traffic_checklist(tab):
-    
-    if tab == 'airport_traffic_tab':
-        disabled = False
-    else:
-        disabled = True
-    
-    options = [
-        {
-            'label': 'Arrival',
-            'value': 'Arrival',
-            'disabled': disabled
-        },
-        {
-            'label': 'Departure',
-            'value': 'Departure',
-            'disabled': disabled
-        },
-    ]
+def update_aircraft_operator_list(tab):
+    check_active_tab(tab, 'aircraft_operator_tab')
+    aircraft_operators = data_load.get_dataset('aircraft_operators')
+    return [{'label': x, 'value': x} for x in calculations.get_unique_values(aircraft_operators, c.ENTITY)]
 
-    values = [x for x in ['Arrival', 'Departure']]
 
-    return options, values
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='update_airport_traffic_checklist'),
+    Output('ifr_movements', 'options'),
+    Output('ifr_movements', 'value'),
+    Input('content_tabs', 'value')
+)
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='select_relevant_controls'),
     Output("states_list", "disabled"),
     Output("acc_list", "disabled"),
     Output("airport_list", "disabled"),
     Output("aircraft_operator_list", "disabled"),
     Input("content_tabs", "value")
 )
-def select_relevant_controls(tab):
-    if tab == 'state_traffic_tab':
-        return False, False, True, True
-    elif tab == 'airport_traffic_tab':
-        return False, True, False, True
-    elif tab == 'aircraft_operator_tab':
-        return True, True, True, False
-    else:
-        return True, True, True, True
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='request_date_range'),
+    Output('date_range_request', 'data'),
+    Input('content_tabs', 'value'),
+    State('date_ranges', 'data')
+)
 
 
 @app.callback(
+    Output('date_ranges', 'data'),
+    Input('date_range_request', 'data'),
+    State('date_ranges', 'data'),
+    prevent_initial_call=True
+)
+def update_date_ranges(tab, date_ranges):
+    """
+    Adds the date range of a tab whose dataset was not cached when the
+    layout was built, the dataset is loaded as the tab is opened
+    """
+    if tab not in TAB_DATASETS:
+        raise PreventUpdate
+    date_ranges = dict(date_ranges or {})
+    date_ranges[tab] = calculations.get_date_picker_range(
+        *data_load.get_date_range(TAB_DATASETS[tab], load=True)
+    )
+    return date_ranges
+
+
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='select_start_date'),
     Output('start_date_picker', 'min_date_allowed'),
     Output('start_date_picker', 'max_date_allowed'),
     Output('start_date_picker', 'date'),
-    Input('content_tabs', 'value')
+    Input('content_tabs', 'value'),
+    Input('date_ranges', 'data')
 )
-def select_start_date(tab):
-    if tab == 'state_traffic_tab':
-        start_date = calculations.get_date(states, min)
-        max_date = calculations.get_last_date(states)
-    elif tab == 'airport_traffic_tab':
-        start_date = calculations.get_date(airports, min)
-        max_date = calculations.get_last_date(airports)
-    elif tab == 'aircraft_operator_tab':
-        start_date = calculations.get_date(aircraft_operators, min)
-        max_date = calculations.get_last_date(aircraft_operators)
-    else:
-        start_date = None
-        max_date = None
-    return start_date, max_date, start_date
 
 
-@app.callback(
+app.clientside_callback(
+    ClientsideFunction(namespace='controls', function_name='select_end_date'),
     Output('end_date_picker', 'min_date_allowed'),
     Output('end_date_picker', 'max_date_allowed'),
     Output('end_date_picker', 'date'),
-    Input('content_tabs', 'value')
+    Input('content_tabs', 'value'),
+    Input('date_ranges', 'data')
 )
-def select_end_date(tab):
-    if tab == 'state_traffic_tab':
-        start_date = calculations.get_date(states, min)
-        end_date = calculations.get_date(states, max)
-        max_date = calculations.get_last_date(states)
-    elif tab == 'airport_traffic_tab':
-        start_date = calculations.get_date(airports, min)
-        end_date = calculations.get_date(airports, max)
-        max_date = calculations.get_last_date(airports)
-    elif tab == 'aircraft_operator_tab':
-        start_date = calculations.get_date(aircraft_operators, min)
-        end_date = calculations.get_date(aircraft_operators, max)
-        max_date = calculations.get_last_date(aircraft_operators)
-    else:
-        start_date = None
-        end_date = None
-        max_date = None
-    return start_date, max_date, end_date
 
 
 # ----- Callback for graphs ------ #
@@ -644,24 +747,30 @@ def select_end_date(tab):
 
 @app.callback(
     Output('airport_traffic_variation', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('airport_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date'),
-    Input('ifr_movements', 'value')
+    Input('ifr_movements', 'value'),
+    Input('airport_traffic_variation', 'relayoutData')
 )
-def update_aiport_traffic_variability(list_of_states, list_of_airports, start_date, end_date, ifr):
+@figure_cache.cached_figure('airports', zoom_argument='relayout_data')
+def update_aiport_traffic_variability(tab, list_of_states, list_of_airports, start_date, end_date, ifr, relayout_data=None):
+    check_active_tab(tab, 'airport_traffic_tab')
+    x_range = get_zoom(relayout_data)
 
-    filtered_data = calculations.filter_airport_dataset(
-        data=airports,
-        states=list_of_states,
-        airports=list_of_airports,
+    flight_columns = calculations.get_flight_columns(ifr)
+    figure_data = calculations.get_airport_traffic_variations(
+        data_load.get_dataset('airports'),
+        flight_columns,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        airports=list_of_airports,
+        states=list_of_states
     )
 
-    flight_columns = calculations.get_flight_columns(ifr)
-    figure_data = calculations.get_number_of_flights(filtered_data, flight_columns)
+    figure_data = calculations.downsample(figure_data, [c.NM_MA, c.APT_MA], x_range)
 
     fig = go.Figure()
     fig.add_trace(
@@ -684,7 +793,9 @@ def update_aiport_traffic_variability(list_of_states, list_of_airports, start_da
 
     fig.update_layout(
         legend=c.HORIZONTAL_LEGEND,
-        margin=c.GRAPH_MARGIN
+        margin=c.GRAPH_MARGIN,
+        # keeps the zoom of the chart when it is redrawn for the zoomed dates
+        uirevision='{}|{}'.format(start_date, end_date)
     )
 
     return fig
@@ -692,21 +803,23 @@ def update_aiport_traffic_variability(list_of_states, list_of_airports, start_da
 
 @app.callback(
     Output('top_10_airports', 'figure'),
+    Input('content_tabs', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date'),
     Input('ifr_movements', 'value')
 )
-def update_top_10_airports_chart(start_date, end_date, ifr):
+@figure_cache.cached_figure('airports')
+def update_top_10_airports_chart(tab, start_date, end_date, ifr):
+    check_active_tab(tab, 'airport_traffic_tab')
+
+    flight_column = calculations.get_flight_column(ifr)
 
-    filtered_data = calculations.filter_airport_dataset(
-        data=airports,
+    figure_data = calculations.get_top_flight_airports(
+        data_load.get_dataset('airports'),
+        flight_column,
         start_date=start_date,
         end_date=end_date
     )
-
-    flight_column = calculations.get_flight_column(ifr)
-
-    figure_data = calculations.get_top_flight_airports(filtered_data, flight_column)
     figure_data = figure_data.sort_values(by=flight_column, ascending=True)
     fig = go.Figure()
     fig.add_trace(
@@ -734,18 +847,19 @@ def update_top_10_airports_chart(start_date, end_date, ifr):
 
 @app.callback(
     Output('top_10_states', 'figure'),
+    Input('content_tabs', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_top_10_states_chart(start_date, end_date):
+@figure_cache.cached_figure('states')
+def update_top_10_states_chart(tab, start_date, end_date):
+    check_active_tab(tab, 'state_traffic_tab')
 
-    filtered_data = calculations.filter_states_data(
-        data=states,
+    figure_data = calculations.get_top_ten_states(
+        data_load.get_dataset('states'),
         start_date=start_date,
         end_date=end_date
     )
-
-    figure_data = calculations.get_top_ten_states(filtered_data)
     figure_data = figure_data.sort_values(by=c.FLIGHTS, ascending=True)
     fig = go.Figure()
     fig.add_trace(
@@ -772,24 +886,26 @@ def update_top_10_states_chart(start_date, end_date):
 
 @app.callback(
     Output('states_map', 'figure'),
+    Input('content_tabs', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_states_map(start_date, end_date):
-    filtered_data = calculations.filter_states_data(
-        data=states,
+@figure_cache.cached_figure('states')
+def update_states_map(tab, start_date, end_date):
+    check_active_tab(tab, 'state_traffic_tab')
+    figure_data = calculations.get_states_flight_data(
+        data_load.get_dataset('states'),
+        [c.ISO, c.ENTITY],
         start_date=start_date,
-        end_date=end_date,
+        end_date=end_date
     )
-    filtered_data = filtered_data[
-        filtered_data[c.ENTITY].ne(c.TOT_NETWORK_AREA)
+    figure_data = figure_data[
+        figure_data[c.ENTITY].ne(c.TOT_NETWORK_AREA)
     ]
-
-    figure_data = calculations.get_states_flight_data(filtered_data, [c.ISO, c.ENTITY])
     
     fig = go.Figure(
         go.Choroplethmapbox(
-            geojson=countries,
+            geojson=get_map_geometry(MAP_ZOOM),
             locations=figure_data[c.ISO],
             text=figure_data[c.ENTITY],
             z=figure_data[c.FLIGHTS],
@@ -804,7 +920,7 @@ def update_states_map(start_date, end_date):
     fig.update_layout(
         margin={"r": 0, "t": 20, "l": 10, "b": 10},
         mapbox_style="carto-positron",
-        mapbox_zoom=2,
+        mapbox_zoom=MAP_ZOOM,
         mapbox_center = {"lat": 53, "lon": 10}
     )
     return fig
@@ -812,21 +928,27 @@ def update_states_map(start_date, end_date):
 
 @app.callback(
     Output('states_traffic_variation', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('start_date_picker', 'date'),
-    Input('end_date_picker', 'date')
+    Input('end_date_picker', 'date'),
+    Input('states_traffic_variation', 'relayoutData')
 )
-def update_states_variation_chart(list_of_states, start_date, end_date):
+@figure_cache.cached_figure('states', zoom_argument='relayout_data')
+def update_states_variation_chart(tab, list_of_states, start_date, end_date, relayout_data=None):
+    check_active_tab(tab, 'state_traffic_tab')
+    x_range = get_zoom(relayout_data)
     
-    filtered_data = calculations.filter_states_traffic_variability(
-        data=states,
+    # Total Network Area is shown when no state is selected
+    figure_data = calculations.get_traffic_variations(
+        data_load.get_dataset('states'),
         start_date=start_date,
         end_date=end_date,
-        states=list_of_states
+        entities=list_of_states or [c.TOT_NETWORK_AREA]
     )
     
-    figure_data = calculations.get_traffic_variations(filtered_data)
-    
+    figure_data = calculations.downsample(figure_data, [c.MA, c.MA_2019], x_range)
+
     fig = go.Figure()
     fig.add_trace(
         go.Scatter(
@@ -848,7 +970,9 @@ def update_states_variation_chart(list_of_states, start_date, end_date):
 
     fig.update_layout(
         legend=c.HORIZONTAL_LEGEND,
-        margin=c.GRAPH_MARGIN
+        margin=c.GRAPH_MARGIN,
+        # keeps the zoom of the chart when it is redrawn for the zoomed dates
+        uirevision='{}|{}'.format(start_date, end_date)
     )
 
     return fig
@@ -856,24 +980,23 @@ def update_states_variation_chart(list_of_states, start_date, end_date):
 
 @app.callback(
     Output('acc_state_traffic', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('acc_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_acc_per_state_chart(list_of_states, acc_centers, start_date, end_date):
+@figure_cache.cached_figure('area_centers')
+def update_acc_per_state_chart(tab, list_of_states, acc_centers, start_date, end_date):
+    check_active_tab(tab, 'state_traffic_tab')
     
-    filtered_data = calculations.filter_area_center_data(
-        data=area_centers,
-        states=list_of_states,
-        area_centers=acc_centers,
-        start_date=start_date,
-        end_date=end_date
-    )
-
     figure_data = calculations.get_area_centers_data(
-        filtered_data,
-        [c.FLIGHTS, c.FLIGHTS_2019]
+        data_load.get_dataset('area_centers'),
+        [c.FLIGHTS, c.FLIGHTS_2019],
+        start_date=start_date,
+        end_date=end_date,
+        states=list_of_states,
+        area_centers=acc_centers
     )
     
     fig = go.Figure()
@@ -912,23 +1035,25 @@ def update_acc_per_state_chart(list_of_states, acc_centers, start_date, end_date
 
 @app.callback(
     Output('state_traffic_bar_chart', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_state_traffic_bar_chart(list_of_states, start_date, end_date):
+@figure_cache.cached_figure('states')
+def update_state_traffic_bar_chart(tab, list_of_states, start_date, end_date):
+    check_active_tab(tab, 'state_traffic_tab')
     
-    filtered_data = calculations.filter_states_data(
-        data=states,
-        states=list_of_states,
+    figure_data = calculations.get_states_flight_data(
+        data_load.get_dataset('states'),
+        c.ENTITY,
         start_date=start_date,
-        end_date=end_date
+        end_date=end_date,
+        states=list_of_states
     )
-    filtered_data = filtered_data[
-        filtered_data[c.ENTITY].ne(c.TOT_NETWORK_AREA)
+    figure_data = figure_data[
+        figure_data[c.ENTITY].ne(c.TOT_NETWORK_AREA)
     ]
-
-    figure_data = calculations.get_states_flight_data(filtered_data, c.ENTITY)
     figure_data = figure_data.sort_values(by=c.FLIGHTS, ascending=False)
 
     fig = go.Figure()
@@ -966,30 +1091,29 @@ def update_state_traffic_bar_chart(list_of_states, start_date, end_date):
 
 @app.callback(
     Output('airport_map', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('airport_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date'),
     Input('ifr_movements', 'value')
 )
-def update_airport_map(list_of_states, list_of_airports, start_date, end_date, ifr):
+@figure_cache.cached_figure('airports', 'airport_dimensions')
+def update_airport_map(tab, list_of_states, list_of_airports, start_date, end_date, ifr):
+    check_active_tab(tab, 'airport_traffic_tab')
 
-    filtered_data = calculations.filter_airport_dataset(
-        data=airports,
-        airports=list_of_airports,
-        states=list_of_states,
-        start_date=start_date,
-        end_date=end_date
-    )
-    
     flight_column = calculations.get_flight_column(ifr)
 
-    figure_data = calculations.get_daily_average_per_airport(filtered_data, flight_column)
-    unfiltered_data = calculations.get_daily_average_per_airport(airports, flight_column)
-    figure_data['Marker Size'] = figure_data.apply(
-        lambda x: calculations.get_marker_size(x, flight_column),
-        axis=1
+    figure_data = calculations.get_daily_average_per_airport(
+        data_load.get_dataset('airports'),
+        data_load.get_dataset('airport_dimensions'),
+        flight_column,
+        start_date=start_date,
+        end_date=end_date,
+        airports=list_of_airports,
+        states=list_of_states
     )
+    figure_data['Marker Size'] = calculations.get_marker_sizes(figure_data[flight_column])
     
     fig = go.Figure(
         go.Scattermapbox(
@@ -1017,21 +1141,23 @@ def update_airport_map(list_of_states, list_of_airports, start_date, end_date, i
 
 @app.callback(
     Output('airport_traffic_per_year', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('airport_list', 'value'),
     Input('ifr_movements', 'value')
 )
-def update_traffic_per_year_chart(list_of_states, list_of_airports, ifr):
+@figure_cache.cached_figure('airports')
+def update_traffic_per_year_chart(tab, list_of_states, list_of_airports, ifr):
+    check_active_tab(tab, 'airport_traffic_tab')
 
-    filtered_dataset = calculations.filter_airport_dataset(
-        data=airports,
+    flight_columns = calculations.get_flight_columns(ifr)
+    figure_data = calculations.get_airport_yearly_averages(
+        data_load.get_dataset('airports'),
+        flight_columns,
         airports=list_of_airports,
         states=list_of_states
     )
 
-    flight_columns = calculations.get_flight_columns(ifr)
-    figure_data = calculations.get_average_per_year(filtered_dataset, flight_columns)
-
     fig = go.Figure()
 
     fig.add_trace(
@@ -1063,24 +1189,26 @@ def update_traffic_per_year_chart(list_of_states, list_of_airports, ifr):
 
 @app.callback(
     Output('seasonal_variability', 'figure'),
+    Input('content_tabs', 'value'),
     Input('states_list', 'value'),
     Input('airport_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date'),
     Input('ifr_movements', 'value')
 )
-def update_seasonal_variability_chart(list_of_states, list_of_airports, start_date, end_date, ifr):
-    filtered_dataset = calculations.filter_airport_dataset(
-        data=airports,
-        airports=list_of_airports,
-        states=list_of_states,
-        start_date=start_date,
-        end_date=end_date
-    )
-
+@figure_cache.cached_figure('airports')
+def update_seasonal_variability_chart(tab, list_of_states, list_of_airports, start_date, end_date, ifr):
+    check_active_tab(tab, 'airport_traffic_tab')
     flight_columns = calculations.get_flight_columns(ifr)
 
-    figure_data = calculations.get_average_per_month(filtered_dataset, flight_columns)
+    figure_data = calculations.get_airport_monthly_averages(
+        data_load.get_dataset('airports'),
+        flight_columns,
+        start_date=start_date,
+        end_date=end_date,
+        airports=list_of_airports,
+        states=list_of_states
+    )
 
     fig = go.Figure()
 
@@ -1114,20 +1242,25 @@ def update_seasonal_variability_chart(list_of_states, list_of_airports, start_da
 
 @app.callback(
     Output('aircraft_operator_traffic_variation', 'figure'),
+    Input('content_tabs', 'value'),
     Input('aircraft_operator_list', 'value'),
     Input('start_date_picker', 'date'),
-    Input('end_date_picker', 'date')
+    Input('end_date_picker', 'date'),
+    Input('aircraft_operator_traffic_variation', 'relayoutData')
 )
-def update_ao_traffic_variation_chart(list_of_operators, start_date, end_date):
+@figure_cache.cached_figure('aircraft_operators', zoom_argument='relayout_data')
+def update_ao_traffic_variation_chart(tab, list_of_operators, start_date, end_date, relayout_data=None):
+    check_active_tab(tab, 'aircraft_operator_tab')
+    x_range = get_zoom(relayout_data)
 
-    filtered_data = calculations.filter_aircraft_operators(
-        data=aircraft_operators,
+    figure_data = calculations.get_traffic_variations(
+        data_load.get_dataset('aircraft_operators'),
         start_date=start_date,
         end_date=end_date,
-        operators=list_of_operators
+        entities=list_of_operators
     )
 
-    figure_data = calculations.get_traffic_variations(filtered_data)
+    figure_data = calculations.downsample(figure_data, [c.MA, c.MA_2019], x_range)
 
     fig = go.Figure()
 
@@ -1151,7 +1284,9 @@ def update_ao_traffic_variation_chart(list_of_operators, start_date, end_date):
 
     fig.update_layout(
         legend=c.HORIZONTAL_LEGEND,
-        margin=c.GRAPH_MARGIN
+        margin=c.GRAPH_MARGIN,
+        # keeps the zoom of the chart when it is redrawn for the zoomed dates
+        uirevision='{}|{}'.format(start_date, end_date)
     )
 
     return fig
@@ -1159,18 +1294,19 @@ def update_ao_traffic_variation_chart(list_of_operators, start_date, end_date):
 
 @app.callback(
     Output('top_10_aircraft_operators', 'figure'),
+    Input('content_tabs', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_top_10_ao_chart(start_date, end_date):
+@figure_cache.cached_figure('aircraft_operators')
+def update_top_10_ao_chart(tab, start_date, end_date):
+    check_active_tab(tab, 'aircraft_operator_tab')
 
-    filtered_data = calculations.filter_aircraft_operators(
-        data=aircraft_operators,
+    figure_data = calculations.get_top_ten_aircraft_operators(
+        data_load.get_dataset('aircraft_operators'),
         start_date=start_date,
         end_date=end_date
     )
-
-    figure_data = calculations.get_top_ten_aircraft_operators(filtered_data)
     figure_data = figure_data.sort_values(by=c.FLIGHTS, ascending=True)
 
     fig = go.Figure()
@@ -1199,21 +1335,21 @@ def update_top_10_ao_chart(start_date, end_date):
 
 @app.callback(
     Output('aircraft_operator_traffic_bar_chart', 'figure'),
+    Input('content_tabs', 'value'),
     Input('aircraft_operator_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_ao_bar_chart(list_of_operators, start_date, end_date):
+@figure_cache.cached_figure('aircraft_operators')
+def update_ao_bar_chart(tab, list_of_operators, start_date, end_date):
+    check_active_tab(tab, 'aircraft_operator_tab')
 
-    filtered_data = calculations.filter_aircraft_operators(
-        data=aircraft_operators,
+    figure_data = calculations.get_states_flight_data(
+        data_load.get_dataset('aircraft_operators'),
+        c.ENTITY,
         start_date=start_date,
         end_date=end_date,
-        operators=list_of_operators
-    )
-
-    figure_data = calculations.get_states_flight_data(
-        filtered_data, c.ENTITY
+        states=list_of_operators
     )
 
     fig = go.Figure()
@@ -1254,24 +1390,20 @@ def update_ao_bar_chart(list_of_operators, start_date, end_date):
 
 @app.callback(
     Output('aircraft_operator_seasonal_variability', 'figure'),
+    Input('content_tabs', 'value'),
     Input('aircraft_operator_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_aircraft_operator_seasonal_variability_chart(list_of_operators, start_date, end_date):
+@figure_cache.cached_figure('aircraft_operators')
+def update_aircraft_operator_seasonal_variability_chart(tab, list_of_operators, start_date, end_date):
+    check_active_tab(tab, 'aircraft_operator_tab')
 
-    filtered_data = calculations.filter_aircraft_operators(
-        data=aircraft_operators,
-        operators=list_of_operators,
+    figure_data = calculations.get_aircraft_operator_monthly_averages(
+        data_load.get_dataset('aircraft_operators'),
         start_date=start_date,
-        end_date=end_date
-    )
-
-    filtered_data[c.MONTH_MON] = filtered_data.apply(lambda x: calculations.get_month_name(x), axis=1)
-    filtered_data[c.MONTH_NUM] = filtered_data[c.DATE].dt.month
-    
-    figure_data = calculations.get_average_per_month(
-        filtered_data, [c.FLIGHTS_2019, c.FLIGHTS]
+        end_date=end_date,
+        operators=list_of_operators
     )
 
     fig = go.Figure()
@@ -1309,37 +1441,23 @@ def update_aircraft_operator_seasonal_variability_chart(list_of_operators, start
 
 @app.callback(
     Output('aircraft_operator_traffic_per_year', 'figure'),
+    Input('content_tabs', 'value'),
     Input('aircraft_operator_list', 'value'),
     Input('start_date_picker', 'date'),
     Input('end_date_picker', 'date')
 )
-def update_aircraft_operator_traffic_per_year_chart(list_of_operators, start_date, end_date):
+@figure_cache.cached_figure('aircraft_operators', 'aircraft_operators_2019')
+def update_aircraft_operator_traffic_per_year_chart(tab, list_of_operators, start_date, end_date):
+    check_active_tab(tab, 'aircraft_operator_tab')
 
-    filtered_data = calculations.filter_aircraft_operators(
-        data=aircraft_operators,
-        operators=list_of_operators,
+    figure_data = calculations.get_aircraft_operator_yearly_averages(
+        data_load.get_dataset('aircraft_operators'),
+        data_load.get_dataset('aircraft_operators_2019'),
         start_date=start_date,
-        end_date=end_date
-    )
-    
-    filtered_data_2019 = calculations.filter_aircraft_operators(
-        data=aircraft_operators_2019,
+        end_date=end_date,
         operators=list_of_operators
     )
 
-    filtered_data[c.YEAR] = filtered_data[c.DATE].dt.year
-    filtered_data_2019[c.YEAR] = filtered_data_2019[c.DATE].dt.year
-    
-    figure_data = calculations.get_average_per_year(
-        filtered_data, c.FLIGHTS
-    )
-    figure_data_2019 = calculations.get_average_per_year(
-        filtered_data_2019, c.FLIGHTS
-    )
-
-    figure_data = calculations.merge_datasets([figure_data, figure_data_2019])
-    figure_data = figure_data.sort_values(by=c.YEAR)
-
     fig = go.Figure()
     colors = [c.BLUE] * len(figure_data)
     colors[0] = c.RED
@@ -0,0 +1,20 @@
+"""
+Queues rows of a file to be appended to a dataset by every process of
+the running app, gunicorn workers included (see data_load.queue_dataset_file).
+The file has the format of the source files of the dataset. Rows for a day
+already loaded are skipped unless --replace is given. Every process appends
+the rows within APPENDS_CHECK_INTERVAL seconds (on its next request after
+that), a dataset which is not loaded yet gets them when it is loaded.
+
+Usage: python append_dataset.py <states|area_centers|airports|aircraft_operators> <file> [--replace]
+"""
+import sys
+import data_load
+
+if __name__ == '__main__':
+    arguments = [argument for argument in sys.argv[1:] if argument != '--replace']
+    if len(arguments) != 2 or arguments[0] not in data_load.DATASET_KEYS:
+        sys.exit(__doc__)
+    name, path = arguments
+    count = data_load.queue_dataset_file(name, path, replace='--replace' in sys.argv[1:])
+    print('Queued {} rows of {} for {}'.format(count, path, name))
@@ -0,0 +1,62 @@
+// Callbacks of the controls which depend only on the state of the page,
+// they run in the browser without a request to the server (see app.py)
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    controls: {
+        toggle_classname: function(n, classname) {
+            if (n && classname === 'collapsed') {
+                return '';
+            }
+            return 'collapsed';
+        },
+
+        toggle_collapse: function(n, is_open) {
+            if (n) {
+                return !is_open;
+            }
+            return is_open;
+        },
+
+        update_airport_traffic_checklist: function(tab) {
+            var disabled = tab !== 'airport_traffic_tab';
+            var options = ['Arrival', 'Departure'].map(function(movement) {
+                return {label: movement, value: movement, disabled: disabled};
+            });
+            return [options, ['Arrival', 'Departure']];
+        },
+
+        // States, ACC, airport and aircraft operator lists enabled on a tab
+        select_relevant_controls: function(tab) {
+            var enabled = {
+                state_traffic_tab: [true, true, false, false],
+                airport_traffic_tab: [true, false, true, false],
+                aircraft_operator_tab: [false, false, false, true]
+            }[tab] || [false, false, false, false];
+            return enabled.map(function(value) { return !value; });
+        },
+
+        // Date ranges of the tabs are stored in the layout, see get_date_ranges in app.py.
+        // A tab without a range asks the server for it (update_date_ranges)
+        request_date_range: function(tab, date_ranges) {
+            if ((date_ranges || {})[tab]) {
+                return window.dash_clientside.no_update;
+            }
+            return tab;
+        },
+
+        select_start_date: function(tab, date_ranges) {
+            var range = (date_ranges || {})[tab];
+            if (!range) {
+                return [null, null, null];
+            }
+            return [range.start, range.max, range.start];
+        },
+
+        select_end_date: function(tab, date_ranges) {
+            var range = (date_ranges || {})[tab];
+            if (!range) {
+                return [null, null, null];
+            }
+            return [range.start, range.max, range.end];
+        }
+    }
+});
@@ -0,0 +1,103 @@
+"""
+Compares time needed by every chart callback of the app to build its figure
+and to encode it to json (as Dash does) with plotly graph objects and with
+figures built as dictionaries (see fast_figures.py). Results of the
+calculations are cached, so the times are those of the figures only.
+
+Usage: python benchmark_figures.py [number of repeats]
+"""
+import os
+import sys
+import time
+import inspect
+import statistics
+
+# Figures have to be built, not read from the cache
+os.environ['FIGURE_CACHE'] = '0'
+
+import plotly.graph_objects
+from plotly.io.json import to_json_plotly
+import app
+import fast_figures
+
+# Tab of every chart callback, other inputs are left empty (all data)
+CALLBACK_TABS = {
+    'update_aiport_traffic_variability': 'airport_traffic_tab',
+    'update_top_10_airports_chart': 'airport_traffic_tab',
+    'update_airport_map': 'airport_traffic_tab',
+    'update_traffic_per_year_chart': 'airport_traffic_tab',
+    'update_seasonal_variability_chart': 'airport_traffic_tab',
+    'update_top_10_states_chart': 'state_traffic_tab',
+    'update_states_map': 'state_traffic_tab',
+    'update_states_variation_chart': 'state_traffic_tab',
+    'update_acc_per_state_chart': 'state_traffic_tab',
+    'update_state_traffic_bar_chart': 'state_traffic_tab',
+    'update_ao_traffic_variation_chart': 'aircraft_operator_tab',
+    'update_top_10_ao_chart': 'aircraft_operator_tab',
+    'update_ao_bar_chart': 'aircraft_operator_tab',
+    'update_aircraft_operator_seasonal_variability_chart': 'aircraft_operator_tab',
+    'update_aircraft_operator_traffic_per_year_chart': 'aircraft_operator_tab',
+}
+
+MODES = {
+    'graph objects': plotly.graph_objects,
+    'dictionaries': fast_figures,
+}
+
+
+def get_callback(name):
+    """
+    Returns the function of a callback without the Dash and figure cache wrappers
+    """
+    function = getattr(app, name)
+    while hasattr(function, '__wrapped__'):
+        function = function.__wrapped__
+    return function
+
+
+def get_arguments(function, tab):
+    arguments = []
+    for name in inspect.signature(function).parameters:
+        if name == 'tab':
+            arguments.append(tab)
+        elif name == 'ifr':
+            arguments.append([])
+        else:
+            arguments.append(None)
+    return arguments
+
+
+def measure(function, arguments, repeats):
+    """
+    Returns median times of building and of encoding a figure in ms
+    """
+    build_times = []
+    encode_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        figure = function(*arguments)
+        built = time.perf_counter()
+        to_json_plotly(figure)
+        build_times.append((built - start) * 1000)
+        encode_times.append((time.perf_counter() - built) * 1000)
+    return statistics.median(build_times), statistics.median(encode_times)
+
+
+if __name__ == '__main__':
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print('{:52}{:>22}{:>22}'.format('', *['{} (ms)'.format(mode) for mode in MODES]))
+    print('{:52}{:>22}{:>22}'.format('callback', *['build + encode'] * len(MODES)))
+    totals = {mode: 0 for mode in MODES}
+    for name, tab in CALLBACK_TABS.items():
+        function = get_callback(name)
+        arguments = get_arguments(function, tab)
+        times = []
+        for mode, module in MODES.items():
+            app.go = module
+            # the first call loads the datasets and calculates the results
+            function(*arguments)
+            build_time, encode_time = measure(function, arguments, repeats)
+            totals[mode] += build_time + encode_time
+            times.append('{:.1f} + {:.1f}'.format(build_time, encode_time))
+        print('{:52}{:>22}{:>22}'.format(name, *times))
+    print('{:52}{:>22}{:>22}'.format('total', *['{:.1f}'.format(total) for total in totals.values()]))
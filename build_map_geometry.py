@@ -0,0 +1,133 @@
+"""
+Builds simplified variants of the states map geometry.
+Borders of 'assets/custom_map.json' are simplified (Douglas-Peucker) with
+a few tolerances and coordinates are rounded, only the countries of
+'datasets/iso_codes.csv' and their ISO code are kept. Each variant is
+written to 'assets/custom_map_<level>.json', the map picks one by its zoom
+(see MAP_GEOMETRY_LEVELS in app.py). Run again after changing the source map.
+
+Usage: python build_map_geometry.py
+"""
+import json
+import numpy as np
+import data_load
+import constants as c
+
+SOURCE_PATH = 'assets/custom_map.json'
+VARIANT_PATH = 'assets/custom_map_{}.json'
+
+# Tolerance in degrees and number of decimals of the coordinates of every
+# variant. A pixel is about 0.18 degree at zoom 2 and 0.02 degree at zoom 5
+LEVELS = {
+    'low': (0.05, 2),
+    'medium': (0.01, 3),
+    'high': (0.002, 4),
+}
+
+
+def simplify_line(points, tolerance):
+    """
+    Returns points of a line kept by Douglas-Peucker simplification:
+    a point is kept if it is further than tolerance from the segment
+    between the points kept around it
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    segments = [(0, len(points) - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        inner = points[first + 1:last]
+        direction = end - start
+        length = np.hypot(*direction)
+        if length == 0:
+            distances = np.hypot(*(inner - start).T)
+        else:
+            distances = np.abs(np.cross(direction, inner - start)) / length
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            segments += [(first, middle), (middle, last)]
+    return points[keep]
+
+
+def simplify_ring(ring, tolerance, decimals):
+    """
+    Returns a simplified closed ring with rounded coordinates
+    or None if it gets smaller than a triangle
+    """
+    points = np.asarray(ring, dtype=np.float64)
+    # Rings are split in two lines, a closed line has no segment to measure from
+    middle = len(points) // 2
+    points = np.concatenate([
+        simplify_line(points[:middle + 1], tolerance)[:-1],
+        simplify_line(points[middle:], tolerance)
+    ])
+    points = np.round(points, decimals)
+    points = points[np.r_[True, np.any(points[1:] != points[:-1], axis=1)]]
+    if len(points) < 4:
+        return None
+    return points.tolist()
+
+
+def simplify_polygon(polygon, tolerance, decimals):
+    """
+    Returns a simplified polygon (outer ring and holes) or None
+    if its outer ring gets too small
+    """
+    rings = [simplify_ring(ring, tolerance, decimals) for ring in polygon]
+    if rings[0] is None:
+        return None
+    return [ring for ring in rings if ring is not None]
+
+
+def simplify_geometry(geometry, tolerance, decimals):
+    """
+    Returns a simplified polygon or multipolygon. Polygons too small for
+    the tolerance are dropped, the largest one is always kept
+    """
+    polygons = geometry['coordinates']
+    if geometry['type'] == 'Polygon':
+        polygons = [polygons]
+    simplified = [simplify_polygon(polygon, tolerance, decimals) for polygon in polygons]
+    simplified = [polygon for polygon in simplified if polygon is not None]
+    if not simplified:
+        largest = max(polygons, key=lambda polygon: len(polygon[0]))
+        simplified = [[np.round(largest[0], decimals).tolist()]]
+    if len(simplified) == 1:
+        return {'type': 'Polygon', 'coordinates': simplified[0]}
+    return {'type': 'MultiPolygon', 'coordinates': simplified}
+
+
+def build_variant(countries, iso_codes, tolerance, decimals):
+    """
+    Returns the map with simplified countries of the given ISO codes,
+    features keep only the ISO code the map is joined on
+    """
+    return {
+        'type': 'FeatureCollection',
+        'features': [
+            {
+                'type': 'Feature',
+                'properties': {'iso_a3': feature['properties']['iso_a3']},
+                'geometry': simplify_geometry(feature['geometry'], tolerance, decimals)
+            }
+            for feature in countries['features']
+            if feature['properties']['iso_a3'] in iso_codes
+        ]
+    }
+
+
+if __name__ == '__main__':
+    with open(SOURCE_PATH) as file:
+        countries = json.load(file)
+    iso_codes = set(data_load.load_iso_codes()[c.ISO])
+
+    for level, (tolerance, decimals) in LEVELS.items():
+        variant = json.dumps(build_variant(countries, iso_codes, tolerance, decimals), separators=(',', ':'))
+        with open(VARIANT_PATH.format(level), 'w') as file:
+            file.write(variant)
+        print('{:8}{:>10,} bytes'.format(level, len(variant)))
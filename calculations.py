@@ -1,28 +1,73 @@
+import os
 import pandas as pd
 import numpy as np
 import constants as c
+import indexes
+import result_cache
 
 # ----- Filtering functions ------- #
 
 
 def filter_dataset_by_date(data, start_date, end_date):
     """
-    Filters dataset based on the start and end date
+    Filters dataset based on the start and end date.
+    Datasets sorted by date are sliced using binary search of the dates
+    """
+    return filter_dataset(data, start_date, end_date)
+
+
+def get_date_mask(data, start_date, end_date):
+    """
+    Returns a mask of the rows of a dataset between the start and end
+    date, used for datasets which are not sorted by date
     """
     if start_date is None:
-        beginning_date = pd.to_datetime(get_date(data, min))
-    else:
-        beginning_date = pd.to_datetime(start_date)
+        start_date = get_date(data, min)
     if end_date is None:
-        ending_date = pd.to_datetime(get_date(data, max))
-    else:
-        ending_date = pd.to_datetime(end_date)
-
-    filtered_dataset = data[
-        data[c.DATE].ge(beginning_date) &
-        data[c.DATE].le(ending_date)
+        end_date = get_date(data, max)
+    return (
+        data[c.DATE].ge(pd.to_datetime(start_date)) &
+        data[c.DATE].le(pd.to_datetime(end_date))
+    ).to_numpy()
+
+
+@result_cache.memoize
+def get_filtered_rows(data, start_date=None, end_date=None, filters=None):
+    """
+    Returns rows of a dataset in the period with the given values of its
+    columns (see filter_dataset) as a slice or an array of positions.
+    Charts of a tab filter the same dataset with the same inputs, the rows
+    are cached so that the filtering runs once for all of them
+    """
+    filters = {column: values for column, values in (filters or {}).items() if values}
+    beginning_date = None if start_date is None else pd.to_datetime(start_date)
+    ending_date = None if end_date is None else pd.to_datetime(end_date)
+
+    if indexes.get_sorted_dates(data) is None:
+        mask = get_date_mask(data, beginning_date, ending_date)
+        if filters:
+            selected = np.zeros(len(data), dtype=bool)
+            selected[indexes.get_row_positions(data, filters)] = True
+            mask &= selected
+        return np.flatnonzero(mask)
+
+    start, end = indexes.get_date_range(data, beginning_date, ending_date)
+    if not filters:
+        return slice(start, end)
+    positions = indexes.get_row_positions(data, filters)
+    return positions[
+        np.searchsorted(positions, start):np.searchsorted(positions, end)
     ]
-    return filtered_dataset
+
+
+def filter_dataset(data, start_date=None, end_date=None, filters=None):
+    """
+    Filters dataset based on the start and end date of the period and
+    lists of values of its columns (filters is a dictionary of columns
+    and lists of values). Rows of the values are found in an inverted
+    index of the dataset instead of checking every row
+    """
+    return data.iloc[get_filtered_rows(data, start_date, end_date, filters)]
 
 
 def filter_aircraft_operators(data, start_date=None, end_date=None, operators=None):
@@ -30,17 +75,10 @@ def filter_aircraft_operators(data, start_date=None, end_date=None, operators=No
     Filters dataset of aircraft operators based on a list of aircraft operators
     and start and end date of the period
     """
-    filtered_data = filter_dataset_by_date(
-        data=data, start_date=start_date, end_date=end_date
+    return filter_dataset(
+        data, start_date, end_date, {c.ENTITY: operators}
     )
 
-    if operators:
-        filtered_data = filtered_data[
-            filtered_data[c.ENTITY].isin(operators)
-        ]
-    
-    return filtered_data
-
 
 def filter_states_traffic_variability(data, start_date=None, end_date=None, states=None):
     """
@@ -48,20 +86,11 @@ def filter_states_traffic_variability(data, start_date=None, end_date=None, stat
     If states is None or [] then it takes Total Netwok Area
     instead of all states
     """
-    filtered_data = filter_dataset_by_date(
-        data=data, start_date=start_date, end_date=end_date
-    )
-
     if states is None or states == []:
-        filtered_data = filtered_data[
-            filtered_data[c.ENTITY].eq(c.TOT_NETWORK_AREA)
-        ]
-    else:
-        filtered_data = filtered_data[
-            filtered_data[c.ENTITY].isin(states)
-        ]
-    
-    return filtered_data
+        states = [c.TOT_NETWORK_AREA]
+    return filter_dataset(
+        data, start_date, end_date, {c.ENTITY: states}
+    )
 
 
 def filter_states_data(data, start_date=None, end_date=None, states=None):
@@ -69,133 +98,188 @@ def filter_states_data(data, start_date=None, end_date=None, states=None):
     Filters states dataframe based on a list of states and 
     start and end date of the period
     """
-    filtered_data = filter_dataset_by_date(
-        data=data, start_date=start_date, end_date=end_date
+    return filter_dataset(
+        data, start_date, end_date, {c.ENTITY: states}
     )
 
-    if states:
-        filtered_data = filtered_data[
-            filtered_data[c.ENTITY].isin(states)
-        ]
-    return filtered_data
-
 
 def filter_area_center_data(data, states=None, area_centers=None, start_date=None, end_date=None):
     """
     Filters ACC centers dataframe data based on a list of states,
     list of ACC centres and start and end date of the period
     """
-    filtered_data = filter_dataset_by_date(
-        data=data, start_date=start_date, end_date=end_date
+    return filter_dataset(
+        data, start_date, end_date, {c.ACC: area_centers, c.STATE_NAME: states}
     )
 
-    if states and area_centers:
-        filtered_data = filtered_data[
-            filtered_data[c.ACC].isin(area_centers) &
-            filtered_data[c.STATE_NAME].isin(states)
-        ]
-    elif states and not area_centers:
-        filtered_data = filtered_data[
-            filtered_data[c.STATE_NAME].isin(states)
-        ]
-    elif not states and area_centers:
-        filtered_data = filtered_data[
-            filtered_data[c.ACC].isin(area_centers)
-        ]
-    return filtered_data
-
 
 def filter_airport_dataset(data, airports=None, states=None, start_date=None, end_date=None):
     """
     Filters airport dataset based on a list of airports and 
     start and end date of the period.
     """
-    filtered_dataset = filter_dataset_by_date(
-        data, start_date, end_date
+    return filter_dataset(
+        data, start_date, end_date, {c.AIRPORT_NAME: airports, c.STATE_NAME: states}
     )
 
-    if airports and states:
-        filtered_dataset = filtered_dataset[
-            filtered_dataset[c.AIRPORT_NAME].isin(airports) &
-            filtered_dataset[c.STATE_NAME].isin(states)
-        ]
-    elif (airports is None or airports == []) and states:
-        filtered_dataset = filtered_dataset[
-            filtered_dataset[c.STATE_NAME].isin(states)
-        ]
-    elif (states is None or states == []) and airports:
-        filtered_dataset = filtered_dataset[
-            filtered_dataset[c.AIRPORT_NAME].isin(airports)
-        ]
-    return filtered_dataset
-
 
 # ----- Functions for calculations ----- #
 
+# Names in the datasets are categorical (see data_load.DATASET_DTYPES),
+# pivot tables are built for the observed categories only and sorted
+# by index to keep the rows in alphabetical order.
+# Daily traffic of states, ACCs and aircraft operators is aggregated from
+# dense entity x day arrays (see indexes.build_cube) instead of pivot tables
+
+
+def get_cube_period(data, key, start_date=None, end_date=None, filters=None):
+    """
+    Returns traffic cube of a dataset, rows of the values of the key column
+    selected by filters and positions of the first and after the last day
+    of the period in the cube
+    """
+    cube = indexes.get_cube(data, key)
+    rows = indexes.get_cube_rows(data, key, filters)
+    start, end = indexes.search_dates(
+        cube['days'],
+        None if start_date is None else pd.to_datetime(start_date),
+        None if end_date is None else pd.to_datetime(end_date)
+    )
+    return cube, rows, start, end
+
+
+def get_daily_averages(data, index, columns, start_date=None, end_date=None, filters=None, key=None):
+    """
+    Returns a dataframe with daily averages of the columns for every value
+    of the key column (the last column of the index by default) in the
+    period. Other index columns label the key (e.g. ISO code of a state).
+    Averages come from running totals of the traffic cube of the dataset,
+    so their cost does not depend on the length of the period
+    """
+    index = [index] if isinstance(index, str) else list(index)
+    key = key or index[-1]
+    cube, rows, start, end = get_cube_period(data, key, start_date, end_date, filters)
+
+    averages = pd.DataFrame({key: np.asarray(cube['keys'][rows], dtype=object)})
+    observed = np.zeros(len(rows), dtype=bool)
+    for column in columns:
+        averages[column], counts = indexes.get_period_averages(cube, column, rows, start, end)
+        observed |= counts > 0
+    averages = averages[observed]
+
+    labels = [column for column in index if column != key]
+    for column in labels:
+        averages[column] = averages[key].map(
+            indexes.get_key_labels(data, key, column)
+        ).to_numpy(dtype=object)
+    averages = averages.dropna(subset=labels)
+    averages = averages[index + [column for column in averages.columns if column not in index]]
+    return averages.sort_values(by=index, kind='mergesort', ignore_index=True)
+
+
+def get_top_k(values, k):
+    """
+    Returns positions of the k largest values in descending order, missing
+    values are skipped. Only the k largest values are sorted, values
+    equal to the k-th largest one are taken and ordered by position
+    """
+    candidates = np.flatnonzero(~np.isnan(values))
+    if len(candidates) > k > 0:
+        kth_value = np.partition(values[candidates], len(candidates) - k)[len(candidates) - k]
+        larger = candidates[values[candidates] > kth_value]
+        equal = candidates[values[candidates] == kth_value]
+        candidates = np.concatenate([larger, equal[:k - len(larger)]])
+    elif k <= 0:
+        candidates = candidates[:0]
+    order = np.lexsort((candidates, -values[candidates]))
+    return candidates[order]
+
+
+def get_top_averages(data, key, column, start_date=None, end_date=None, k=10,
+                     excluded=None, label=None):
+    """
+    Returns a dataframe with k values of the key column with the highest
+    daily average of the column in the period, in descending order.
+    Values in the excluded list are skipped, ties are ordered by name.
+    If label is given the values are named by that column
+    (e.g. airport name instead of ICAO code)
+    """
+    cube, rows, start, end = get_cube_period(data, key, start_date, end_date)
+    if excluded:
+        rows = rows[~cube['keys'][rows].isin(excluded)]
+    averages, _ = indexes.get_period_averages(cube, column, rows, start, end)
+    top = get_top_k(averages, k)
+
+    names = cube['keys'][rows[top]]
+    if label:
+        names = names.map(indexes.get_key_labels(data, key, label))
+    return pd.DataFrame({
+        label or key: np.asarray(names, dtype=object),
+        column: averages[top]
+    })
+
+
+def get_daily_totals(data, key, columns, start_date=None, end_date=None, filters=None):
+    """
+    Returns a dataframe with total of the columns over the values of the
+    key column selected by filters for every day of the period which has
+    data. Totals are computed from the traffic cube of the dataset
+    """
+    cube, rows, start, end = get_cube_period(data, key, start_date, end_date, filters)
+
+    observed = indexes.get_daily_totals(cube['rows'], rows, start, end) > 0
+    totals = pd.DataFrame({c.DATE: cube['days'][start:end][observed]})
+    for column in columns:
+        values = indexes.get_daily_totals(cube['values'][column], rows, start, end)[observed]
+        if pd.api.types.is_integer_dtype(cube['dtypes'][column]):
+            values = np.rint(values).astype(np.int64)
+        totals[column] = values
+    return totals
 
-def get_states_flight_data(data, index):
+
+@result_cache.memoize
+def get_states_flight_data(data, index, start_date=None, end_date=None, states=None):
     """
     Returns a dataframe suitable to use for map choropleth chart or bar chart
     Groups data by country and calculates daily average number of flights
     """
-    pivot = pd.pivot_table(
-        data,
-        values=[c.FLIGHTS, c.FLIGHTS_2019],
-        index=index,
-        aggfunc=np.mean
+    return get_daily_averages(
+        data, index, [c.FLIGHTS, c.FLIGHTS_2019],
+        start_date, end_date, {c.ENTITY: states}
     )
-    pivot = pivot.reset_index()
-    return pivot
 
 
-def get_top_ten_states(data):
+@result_cache.memoize
+def get_top_ten_states(data, start_date=None, end_date=None, k=10):
     """
     Return a dataframe with a list of top ten countries with higher
     levels of traffic
     """
-    states_flight_data = pd.pivot_table(
-        data,
-        values=c.FLIGHTS,
-        index=c.ENTITY,
-        aggfunc=np.mean
+    return get_top_averages(
+        data, c.ENTITY, c.FLIGHTS, start_date, end_date, k,
+        excluded=[c.TOT_NETWORK_AREA]
     )
-    states_flight_data = states_flight_data.reset_index()
-    states_flight_data = states_flight_data[
-        states_flight_data[c.ENTITY].ne(c.TOT_NETWORK_AREA)
-    ]
-    states_flight_data = states_flight_data.sort_values(by=c.FLIGHTS, ascending=False)
-    return states_flight_data.head(10)
 
 
-def get_top_ten_aircraft_operators(data):
+@result_cache.memoize
+def get_top_ten_aircraft_operators(data, start_date=None, end_date=None, k=10):
     """
     Return a dataframe with a list of top ten aircraft operators with higher
     levels of traffic
     """
-    ao_flight_data = pd.pivot_table(
-        data,
-        values=c.FLIGHTS,
-        index=c.ENTITY,
-        aggfunc=np.mean
-    )
-    ao_flight_data = ao_flight_data.reset_index()
-    
-    ao_flight_data = ao_flight_data.sort_values(by=c.FLIGHTS, ascending=False)
-    return ao_flight_data.head(10)
+    return get_top_averages(data, c.ENTITY, c.FLIGHTS, start_date, end_date, k)
 
 
-def get_area_centers_data(data, fields):
+@result_cache.memoize
+def get_area_centers_data(data, fields, start_date=None, end_date=None, states=None, area_centers=None):
     """
     Return a dataframe with a list of area centers corresponding
     flight levels
     """
-    area_center_flight_data = pd.pivot_table(
-        data,
-        values=fields,
-        index=[c.STATE_NAME, c.ACC],
-        aggfunc=np.mean
+    area_center_flight_data = get_daily_averages(
+        data, [c.STATE_NAME, c.ACC], fields, start_date, end_date,
+        {c.ACC: area_centers, c.STATE_NAME: states}
     )
-    area_center_flight_data = area_center_flight_data.reset_index()
     area_center_flight_data = area_center_flight_data.sort_values(by=c.FLIGHTS, ascending=False)
     return area_center_flight_data
 
@@ -251,29 +335,25 @@ def get_number_of_flights(data, flight_columns):
 
     pivot = pd.pivot_table(
         data, values=flight_columns, index=c.DATE,
-        aggfunc=np.sum
-    )
+        aggfunc=np.sum,
+        observed=True
+    ).sort_index()
     pivot = pivot.reset_index()
-    pivot[c.NM_MA] = pivot[flight_columns[0]].rolling(7, min_periods=1).mean()
-    pivot[c.APT_MA] = pivot[flight_columns[1]].rolling(7, min_periods=1).mean()
+    pivot[c.NM_MA], pivot[c.APT_MA] = indexes.get_rolling_means(
+        pivot[flight_columns[:2]].to_numpy(dtype=np.float64).T
+    )
     return pivot
 
 
-def get_top_flight_airports(data, flight_column):
+@result_cache.memoize
+def get_top_flight_airports(data, flight_column, start_date=None, end_date=None, k=10):
     """
     Returns top 10 airports with daily average flights
     """
-    
-    pivot = pd.pivot_table(
-        data, values=flight_column, index=c.AIRPORT_NAME,
-        aggfunc=np.mean
+    return get_top_averages(
+        data, c.AIRPORT_CODE, flight_column, start_date, end_date, k,
+        label=c.AIRPORT_NAME
     )
-    if not pivot.empty:
-        pivot = pivot.reset_index()
-        pivot = pivot.sort_values(by=flight_column, ascending=False)
-        return pivot.head(10)
-    else:
-        return pd.DataFrame(columns=[c.AIRPORT_NAME, flight_column])
 
 
 def get_daily_average_per_state(data, flight_columns):
@@ -285,37 +365,38 @@ def get_daily_average_per_state(data, flight_columns):
     if has_airport_data(data):
         pivot = pd.pivot_table(
             data, values=flight_columns, index=c.STATE_NAME,
-            aggfunc=np.sum
-        )
+            aggfunc=np.sum,
+            observed=True
+        ).sort_index()
     else:
         pivot = pd.pivot_table(
             data, values=flight_columns[0], index=c.STATE_NAME,
-            aggfunc=np.sum
-        )
+            aggfunc=np.sum,
+            observed=True
+        ).sort_index()
     pivot = pivot.reset_index()
     pivot = pivot.sort_values(by=c.STATE_NAME)
     return pivot
 
 
-def get_daily_average_per_airport(data, flight_column):
+@result_cache.memoize
+def get_daily_average_per_airport(data, airport_dimensions, flight_column, start_date=None,
+                                  end_date=None, airports=None, states=None):
     """
     Takes a dataset and returns a dataframe with airports
-    and a number of daily flights according to NM
-    Resulting dataframe is merged with geojson to get
-    coordinates of airports
+    and a number of daily flights according to NM.
+    Name, ISO code and coordinates of the airports are taken
+    from the airport dimension table (see data_load)
     """
-    pivot = pd.pivot_table(
-        data, values=flight_column, index=[c.AIRPORT_CODE, c.AIRPORT_NAME, c.ISO],
-        aggfunc=np.mean
-    )
-    
-    pivot = pivot.join(
-      airport_coordinates.set_index(c.AIRPORT_CODE),
-      on=c.AIRPORT_CODE,
-      how='left'
+    cube, rows, start, end = get_cube_period(
+        data, c.AIRPORT_CODE, start_date, end_date,
+        {c.AIRPORT_NAME: airports, c.STATE_NAME: states}
     )
-    pivot = pivot.reset_index()
-    return pivot
+    averages, counts = indexes.get_period_averages(cube, flight_column, rows, start, end)
+    airport_data = airport_dimensions.reindex(cube['keys'][rows[counts > 0]])
+    airport_data[flight_column] = averages[counts > 0]
+    airport_data = airport_data.dropna(subset=[c.ISO])
+    return airport_data.reset_index()
 
 
 def get_average_per_year(data, flight_columns):
@@ -326,8 +407,9 @@ def get_average_per_year(data, flight_columns):
     """
     pivot = pd.pivot_table(
         data, values=flight_columns, index=[c.YEAR],
-        aggfunc=np.mean
-    )
+        aggfunc=np.mean,
+        observed=True
+    ).sort_index()
     pivot = pivot.sort_values(by=c.YEAR)
     pivot=pivot.reset_index()
     return pivot
@@ -341,13 +423,92 @@ def get_average_per_month(data, flight_columns):
     """
     pivot = pd.pivot_table(
         data, values=flight_columns, index=[c.MONTH_MON, c.MONTH_NUM],
-        aggfunc=np.mean
-    )
+        aggfunc=np.mean,
+        observed=True
+    ).sort_index()
     pivot = pivot.sort_values(by=c.MONTH_NUM)
     pivot = pivot.reset_index()
     return pivot
 
 
+@result_cache.memoize
+def get_airport_traffic_variations(data, flight_columns, start_date=None, end_date=None,
+                                   airports=None, states=None):
+    """
+    Returns daily flights of the selected airports (see get_number_of_flights)
+    """
+    filtered_data = filter_airport_dataset(data, airports, states, start_date, end_date)
+    return get_number_of_flights(filtered_data, flight_columns)
+
+
+@result_cache.memoize
+def get_airport_yearly_averages(data, flight_columns, airports=None, states=None):
+    """
+    Returns daily average flights of the selected airports per year
+    """
+    filtered_data = filter_airport_dataset(data, airports, states)
+    return get_average_per_year(filtered_data, flight_columns)
+
+
+@result_cache.memoize
+def get_airport_monthly_averages(data, flight_columns, start_date=None, end_date=None,
+                                 airports=None, states=None):
+    """
+    Returns daily average flights of the selected airports per month
+    """
+    filtered_data = filter_airport_dataset(data, airports, states, start_date, end_date)
+    return get_average_per_month(filtered_data, flight_columns)
+
+
+@result_cache.memoize
+def get_aircraft_operator_monthly_averages(data, start_date=None, end_date=None, operators=None):
+    """
+    Returns daily average flights and flights in 2019
+    of the selected aircraft operators per month
+    """
+    filtered_data = filter_aircraft_operators(data, start_date, end_date, operators)
+    filtered_data = filtered_data.assign(**{
+        c.MONTH_MON: get_month_names(filtered_data[c.DATE]),
+        c.MONTH_NUM: filtered_data[c.DATE].dt.month
+    })
+    return get_average_per_month(filtered_data, [c.FLIGHTS_2019, c.FLIGHTS])
+
+
+@result_cache.memoize
+def get_aircraft_operator_yearly_averages(data, data_2019, start_date=None, end_date=None, operators=None):
+    """
+    Returns daily average flights of the selected aircraft operators per
+    year, 2019 comes from the dataset of the reference flights of 2019
+    """
+    filtered_data = filter_aircraft_operators(data, start_date, end_date, operators)
+    filtered_data = filtered_data.assign(**{c.YEAR: filtered_data[c.DATE].dt.year})
+    averages = get_average_per_year(filtered_data, c.FLIGHTS)
+    baseline = get_baseline_averages(data_2019, c.ENTITY, operators)
+    return merge_datasets([averages, baseline]).sort_values(by=c.YEAR)
+
+
+def get_baseline_averages(baseline, key, values=None):
+    """
+    Returns daily average flights of 2019 of the selected values of the
+    key column per year. Baseline is a dataset of 2019 flights (see
+    data_load.get_baseline_2019_data), the averages are looked up in its
+    traffic cube instead of filtering it
+    """
+    cube = indexes.get_cube(baseline, key)
+    rows = indexes.get_cube_rows(baseline, key, {key: values})
+    years = np.asarray(pd.DatetimeIndex(cube['days']).year)
+    bounds = np.concatenate([
+        [0], np.flatnonzero(years[1:] != years[:-1]) + 1, [len(years)]
+    ])
+    sums = np.diff(cube['values'][c.FLIGHTS][rows][:, bounds].sum(axis=0))
+    counts = np.diff(cube['counts'][c.FLIGHTS][rows][:, bounds].sum(axis=0))
+    observed = counts > 0
+    return pd.DataFrame({
+        c.YEAR: years[bounds[:-1]][observed],
+        c.FLIGHTS: sums[observed] / counts[observed]
+    })
+
+
 def get_unique_values(data, field):
     """
     Returns a list of unique values of a field from the dataset
@@ -373,17 +534,37 @@ def get_last_date(data):
     ).strftime('%m/%d/%Y')
 
 
+def get_date_picker_range(start_date, end_date):
+    """
+    Returns first and last date of a dataset and the day after the last
+    one in the format of the date pickers
+    """
+    return {
+        'start': start_date.strftime('%m/%d/%Y'),
+        'end': end_date.strftime('%m/%d/%Y'),
+        'max': (end_date + pd.Timedelta(days=1)).strftime('%m/%d/%Y')
+    }
 
-def get_traffic_variations(data):
-    traffic_variations = pd.pivot_table(
-        data,
-        values=[c.MA, c.FLIGHTS, c.FLIGHTS_2019, c.FLIGHTS_2020],
-        index=c.DATE,
-        aggfunc=np.sum
+
+@result_cache.memoize
+def get_traffic_variations(data, start_date=None, end_date=None, entities=None, window=7):
+    """
+    Returns daily totals of flights of the selected entities with moving
+    averages over window days of the totals. Totals are taken from window - 1
+    days before the start date, so the first days average whole windows too
+    """
+    first_date = None
+    if start_date is not None:
+        first_date = pd.to_datetime(start_date) - pd.Timedelta(days=window - 1)
+    traffic_variations = get_daily_totals(
+        data, c.ENTITY, [c.FLIGHTS, c.FLIGHTS_2019, c.FLIGHTS_2020],
+        first_date, end_date, {c.ENTITY: entities}
     )
-    
-    traffic_variations = traffic_variations.reset_index()
-    traffic_variations[c.MA_2019] = traffic_variations[c.FLIGHTS_2019].rolling(7, min_periods=1).mean()
+    traffic_variations[c.MA] = indexes.get_rolling_means(traffic_variations[c.FLIGHTS], window)
+    traffic_variations[c.MA_2019] = indexes.get_rolling_means(traffic_variations[c.FLIGHTS_2019], window)
+    if start_date is not None:
+        in_period = traffic_variations[c.DATE].ge(pd.to_datetime(start_date)).to_numpy()
+        traffic_variations = traffic_variations[in_period].reset_index(drop=True)
     return traffic_variations
 
 
@@ -394,6 +575,63 @@ def merge_datasets(datasets):
     return pd.concat(datasets)
 
 
+# ----- Downsampling of time series charts ----- #
+
+# Number of points of the time series charts, about a point for every two
+# pixels of a chart. Longer series are downsampled before they are drawn
+TRACE_POINTS = int(os.environ.get('TRACE_POINTS', '500'))
+
+
+def get_downsampled_rows(values, points):
+    """
+    Returns ascending positions of the rows kept when series (columns of
+    a 2-d array) are reduced to about the given number of points.
+    Rows are split into buckets of consecutive rows and the rows with the
+    lowest and the highest value of every series in a bucket are kept,
+    so peaks and troughs stay on the chart. First and last rows are kept
+    """
+    length, series = values.shape
+    if length <= points:
+        return np.arange(length)
+    buckets = max(points // (2 * series), 1)
+    bucket_of_rows = np.arange(length) * buckets // length
+    bounds = np.searchsorted(bucket_of_rows, np.arange(buckets))
+    kept = [np.array([0, length - 1])]
+    for column in values.T:
+        # rows sorted by bucket and value, missing values are sorted last
+        kept.append(np.lexsort((column, bucket_of_rows))[bounds])
+        kept.append(np.lexsort((-column, bucket_of_rows))[bounds])
+    return np.unique(np.concatenate(kept))
+
+
+def get_x_range(relayout_data):
+    """
+    Returns first and last date shown by a zoomed chart
+    (from relayoutData of the chart) or None
+    """
+    relayout_data = relayout_data or {}
+    x_range = relayout_data.get('xaxis.range')
+    if x_range is None and 'xaxis.range[0]' in relayout_data:
+        x_range = [relayout_data['xaxis.range[0]'], relayout_data.get('xaxis.range[1]')]
+    if not x_range:
+        return None
+    return [pd.Timestamp(date) for date in x_range]
+
+
+def downsample(data, columns, x_range=None, points=None):
+    """
+    Returns rows of a dataframe with daily values sorted by date kept to
+    draw the columns with about TRACE_POINTS points. Only the rows in
+    x_range of a zoomed chart (and the days around it, so the lines reach
+    the edges) are taken, so zooming in shows more details
+    """
+    if x_range:
+        start, end = indexes.search_dates(data[c.DATE].to_numpy(), *x_range)
+        data = data.iloc[max(start - 1, 0):end + 1]
+    rows = get_downsampled_rows(data[columns].to_numpy(dtype=np.float64), points or TRACE_POINTS)
+    return data.iloc[rows]
+
+
 # ----- Definitions for functions to be used to create columns --- #
 
 
@@ -424,12 +662,31 @@ def get_month_name(row):
     return month_name.upper()[:3]
 
 
-# ---- Upload of additional dataset to get airport coordinates ----- #
+# Vectorized versions of get_marker_size and get_month_name,
+# the functions above are kept as the reference of their results
+
+MARKER_INITIAL_SIZE = 6
+MARKER_SIZE_STEP = 4
+MARKER_SIZE_THRESHOLDS = [100, 300, 500, 700, 900, 1100]
 
-airport_coordinates = pd.read_csv(
-    'datasets/airport_coordinates.csv',
-    delimiter=';',
-    decimal=','
-)
-airport_coordinates = airport_coordinates.drop(labels=c.AIRPORT_NAME, axis=1)
+MONTH_NAMES = np.array([
+    'JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN',
+    'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'
+])
 
+
+def get_marker_sizes(values):
+    """
+    Returns marker sizes for a series of numbers of flights, every
+    threshold passed adds a step to the size (see get_marker_size).
+    Missing values get the largest size as in get_marker_size
+    """
+    bins = np.digitize(np.asarray(values, dtype=np.float64), MARKER_SIZE_THRESHOLDS)
+    return MARKER_INITIAL_SIZE + MARKER_SIZE_STEP * bins
+
+
+def get_month_names(dates):
+    """
+    Returns first three letters of the month names of a series of dates
+    """
+    return pd.Series(MONTH_NAMES[dates.dt.month.to_numpy() - 1], index=dates.index)
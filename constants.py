@@ -34,6 +34,34 @@ AIRPORT_ARR_FLIGHTS = 'FLT_ARR_IFR_2'
 AIRPORT_TOTAL_FLIGHTS = 'FLT_TOT_IFR_2'
 DAILY_AVERAGE = 'Daily Average'
 
+# Names used in the source files which are replaced by the names
+# used in the dashboard and in iso_codes.csv
+STATE_NAMES = {
+    'Bosnia-Herzegovina': 'Bosnia and Herzegovina',
+    'Serbia & Montenegro': 'Serbia',
+    'North Macedonia': 'Republic of North Macedonia',
+}
+
+# Aircraft operators which are reported under different names over
+# the years are merged under the name of their group
+AIRCRAFT_OPERATOR_NAMES = {
+    'Ryanair': 'Ryanair Group',
+    'easyJet': 'easyJet Group',
+    'KLM': 'KLM Group',
+    'Wizz Air': 'Wizz Air Group',
+    'SAS': 'SAS Group',
+    'SWISS': 'SWISS Group',
+    'TAP': 'TAP Group',
+    'Aer Lingus': 'Aer Lingus Group',
+    'Air France': 'Air France Group',
+    'Eurowings': 'Eurowings Group',
+    'Iberia': 'Iberia Group',
+    'British Airways': 'British Airways Group',
+    'Lufthansa': 'Lufthansa Airlines',
+    'DHL Express': 'DHL Group',
+    'Aegean Airlines': 'AEGEAN Group',
+}
+
 
 # STYLES for Graphs and Dash elements
 BACKGROUND_COLOR = '#f8f9fa'
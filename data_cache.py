@@ -0,0 +1,238 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+# ----- Local binary cache of the parsed datasets ----- #
+#
+# Every dataset is stored as a directory with one NumPy file per column
+# and a json manifest describing the columns and the source files
+# (size, modification time and hash) the dataset was built from.
+# Text columns are stored as integer codes plus an array of unique values,
+# so that no pickling is needed to read them back. The manifest also holds
+# the first and last value of every date column, so the date range of a
+# dataset is known without reading its columns (see get_date_range).
+
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR', os.path.join('datasets', '.cache'))
+CACHE_ENABLED = os.environ.get('DATASET_CACHE', '1') != '0'
+
+# Increase when the loaders in data_load produce different frames
+# so that caches built by an older version of the code are rebuilt
+CACHE_VERSION = 5
+
+
+def get_file_hash(path):
+    """
+    Returns sha256 hash of a file content
+    """
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def get_file_fingerprint(path, previous=None):
+    """
+    Returns size, modification time and hash of a file.
+    The hash is taken from the previous fingerprint if the size and
+    the modification time have not changed
+    """
+    stat = os.stat(path)
+    fingerprint = {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns
+    }
+    if (previous and previous['size'] == fingerprint['size'] and
+            previous['mtime'] == fingerprint['mtime']):
+        fingerprint['hash'] = previous['hash']
+    else:
+        fingerprint['hash'] = get_file_hash(path)
+    return fingerprint
+
+
+def get_manifest_path(name):
+    return os.path.join(CACHE_DIR, '{}.json'.format(name))
+
+
+def read_manifest(name):
+    """
+    Returns manifest of a cached dataset or None if there is no cache
+    """
+    try:
+        with open(get_manifest_path(name)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(name, manifest):
+    """
+    Replaces the manifest atomically, so that other processes
+    never read a partially written file
+    """
+    descriptor, temp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(temp_path, get_manifest_path(name))
+
+
+def is_manifest_valid(manifest, sources, params):
+    """
+    Checks if a cached dataset was built from the same source files
+    with the same parameters. Updates fingerprints of the files that were
+    touched but whose content has not changed
+    """
+    if manifest is None:
+        return False
+    if manifest.get('version') != CACHE_VERSION or manifest.get('params') != params:
+        return False
+    if sorted(manifest['sources']) != sorted(sources):
+        return False
+    for path in sources:
+        previous = manifest['sources'][path]
+        try:
+            fingerprint = get_file_fingerprint(path, previous)
+        except OSError:
+            return False
+        if fingerprint['hash'] != previous['hash']:
+            return False
+        manifest['sources'][path] = fingerprint
+    return True
+
+
+def write_columns(directory, data):
+    """
+    Writes every column of a dataframe into a separate NumPy file
+    and returns a description of the stored columns
+    """
+    columns = []
+    for position, name in enumerate(data.columns):
+        column = data[name]
+        file_name = '{}.npy'.format(position)
+        if pd.api.types.is_categorical_dtype(column) or column.dtype == object:
+            kind = 'category' if pd.api.types.is_categorical_dtype(column) else 'object'
+            categorical = pd.Categorical(column)
+            np.save(os.path.join(directory, file_name), categorical.codes)
+            np.save(
+                os.path.join(directory, '{}.categories.npy'.format(position)),
+                np.asarray(categorical.categories, dtype=str)
+            )
+        else:
+            kind = 'values'
+            np.save(os.path.join(directory, file_name), column.to_numpy())
+        columns.append({'name': name, 'kind': kind, 'file': file_name})
+    return columns
+
+
+def read_columns(directory, columns):
+    """
+    Reads dataframe stored by write_columns
+    """
+    data = {}
+    for column in columns:
+        values = np.load(os.path.join(directory, column['file']))
+        if column['kind'] != 'values':
+            categories = np.load(
+                os.path.join(directory, column['file'].replace('.npy', '.categories.npy'))
+            )
+            values = pd.Categorical.from_codes(values, categories.astype(object))
+            if column['kind'] == 'object':
+                values = values.astype(object)
+        data[column['name']] = values
+    return pd.DataFrame(data, columns=[column['name'] for column in columns])
+
+
+def get_date_ranges(data):
+    """
+    Returns first and last value of every date column of a dataframe
+    as ISO strings, missing dates are ignored
+    """
+    ranges = {}
+    for name in data.columns:
+        if pd.api.types.is_datetime64_any_dtype(data[name]) and data[name].notna().any():
+            ranges[name] = [data[name].min().isoformat(), data[name].max().isoformat()]
+    return ranges
+
+
+def read_cached_dataset(manifest):
+    return read_columns(os.path.join(CACHE_DIR, manifest['directory']), manifest['columns'])
+
+
+def write_cached_dataset(name, data, sources, params):
+    """
+    Stores a dataset in the cache. The columns are written into a new
+    directory which becomes visible only once the manifest is replaced
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    directory = tempfile.mkdtemp(dir=CACHE_DIR, prefix='{}-'.format(name))
+    manifest = {
+        'version': CACHE_VERSION,
+        'params': params,
+        'sources': {path: get_file_fingerprint(path) for path in sources},
+        'directory': os.path.basename(directory),
+        'columns': write_columns(directory, data),
+        'date_ranges': get_date_ranges(data)
+    }
+    write_manifest(name, manifest)
+    remove_unused_directories(name, manifest['directory'])
+
+
+def remove_unused_directories(name, directory):
+    """
+    Removes directories left by previous versions of a cached dataset
+    """
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith('{}-'.format(name)) and entry != directory:
+            shutil.rmtree(os.path.join(CACHE_DIR, entry), ignore_errors=True)
+
+
+def get_date_range(name, column, sources, params=None):
+    """
+    Returns first and last date of a column of a cached dataset from its
+    manifest, without reading the dataset, or None if the dataset is not
+    cached or the cache is out of date
+    """
+    if not CACHE_ENABLED:
+        return None
+    manifest = read_manifest(name)
+    if not is_manifest_valid(manifest, sources, params):
+        return None
+    date_range = manifest.get('date_ranges', {}).get(column)
+    if date_range is None:
+        return None
+    return [pd.Timestamp(date) for date in date_range]
+
+
+def get_dataset(name, sources, builder, params=None):
+    """
+    Returns a dataset from the cache if it is still up to date with
+    its source files, otherwise builds it and stores in the cache
+    """
+    if not CACHE_ENABLED:
+        return builder()
+
+    manifest = read_manifest(name)
+    previous_sources = dict(manifest['sources']) if manifest else None
+    if is_manifest_valid(manifest, sources, params):
+        try:
+            data = read_cached_dataset(manifest)
+        except (OSError, ValueError, KeyError):
+            pass
+        else:
+            if manifest['sources'] != previous_sources:
+                try:
+                    write_manifest(name, manifest)
+                except OSError:
+                    pass
+            return data
+
+    data = builder()
+    try:
+        write_cached_dataset(name, data, sources, params)
+    except OSError:
+        pass
+    return data
@@ -1,67 +1,194 @@
-from copy import deepcopy
 import pandas as pd
 import numpy as np
 import constants as c
-import datetime
+import data_cache
+import indexes
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+YEARS = ['2020', '2021', '2022']
+AIRPORTS_PATH = 'datasets/Airport_Traffic.csv'
+ISO_CODES_PATH = 'datasets/iso_codes.csv'
+AIRPORT_COORDINATES_PATH = 'datasets/airport_coordinates.csv'
 
-def rename_state_names(dataset, field):
-    data = dataset.copy(deep=True)
+# Number of threads used to parse files and build datasets concurrently,
+# 1 (or less) loads everything sequentially
+LOAD_WORKERS = max(1, int(os.environ.get('DATA_LOAD_WORKERS', '4')))
 
-    data[field] = data[field].str.replace(
-        'Bosnia-Herzegovina',
-        'Bosnia and Herzegovina',
-        regex=False
-    )
-    data[field] = data[field].str.replace(
-        'Serbia & Montenegro',
-        'Serbia',
-        regex=False
-    )
-    data[field] =data[field].str.replace(
-        'North Macedonia',
-        'Republic of North Macedonia',
-        regex=False
-    )
+# Number of rows of the airport traffic file parsed at once
+AIRPORTS_CHUNK_SIZE = 10000
+
+
+def get_list_variable(name):
+    """
+    Returns a list from a comma separated environment variable
+    or None if the variable is not set
+    """
+    value = os.environ.get(name)
+    if not value:
+        return None
+    return [item.strip() for item in value.split(',')]
+
+
+# Optional limits of the airport traffic kept by the dashboard, rows
+# outside of the dates or not in the lists of states and airports (ICAO
+# codes) are dropped while the file is read
+AIRPORTS_FILTERS = {
+    'start_date': os.environ.get('AIRPORTS_START_DATE'),
+    'end_date': os.environ.get('AIRPORTS_END_DATE'),
+    'states': get_list_variable('AIRPORTS_STATES'),
+    'airports': get_list_variable('AIRPORTS_ICAO_CODES'),
+}
+
+# Columns used by the dashboard and their types. Names repeated on every
+# row are stored as categories and numbers in 32 bits or less,
+# flights which may be missing are stored as floats
+DATASET_DTYPES = {
+    'states': {
+        c.ENTITY: 'category',
+        c.ISO: 'category',
+        c.DATE: 'datetime64[ns]',
+        c.FLIGHTS: np.int32,
+        c.MA: np.float32,
+        c.FLIGHTS_2019: np.int32,
+        c.FLIGHTS_2020: np.float32,
+    },
+    'area_centers': {
+        c.ACC: 'category',
+        c.STATE_NAME: 'category',
+        c.DATE: 'datetime64[ns]',
+        c.FLIGHTS: np.int32,
+        c.FLIGHTS_2019: np.int32,
+    },
+    'airports': {
+        c.YEAR: np.int16,
+        c.MONTH_NUM: np.int8,
+        c.MONTH_MON: 'category',
+        c.DATE: 'datetime64[ns]',
+        c.AIRPORT_CODE: 'category',
+        c.AIRPORT_NAME: 'category',
+        c.STATE_NAME: 'category',
+        c.ISO: 'category',
+        c.NM_DEP_FLIGHTS: np.float32,
+        c.NM_ARR_FLIGHTS: np.float32,
+        c.NM_TOTAL_FLIGHTS: np.float32,
+        c.AIRPORT_DEP_FLIGHTS: np.float32,
+        c.AIRPORT_ARR_FLIGHTS: np.float32,
+        c.AIRPORT_TOTAL_FLIGHTS: np.float32,
+    },
+    'aircraft_operators': {
+        c.ENTITY: 'category',
+        c.DATE: 'datetime64[ns]',
+        c.FLIGHTS: np.int32,
+        c.MA: np.float32,
+        c.DATE_2019: 'datetime64[ns]',
+        c.FLIGHTS_2019: np.int32,
+        c.FLIGHTS_2020: np.float32,
+    },
+}
+
+
+def optimize_dtypes(data, dtypes):
+    """
+    Keeps only the given columns of a dataset and converts them
+    to the given types
+    """
+    if list(data.columns) == list(dtypes) and all(
+            data[column].dtype == dtype for column, dtype in dtypes.items()):
+        return data
+    data = data[list(dtypes)].astype(dtypes)
+    return data.reset_index(drop=True)
+
+
+def sort_by_date(data):
+    """
+    Sorts a dataset by date keeping the order of rows of the same day,
+    so that calculations can find a period of time by binary search
+    """
+    if data[c.DATE].is_monotonic_increasing:
+        return data
+    return data.sort_values(c.DATE, kind='mergesort', ignore_index=True)
+
+
+def rename_entities(data, field, names):
+    """
+    Replaces names in a field of a dataset using a mapping of names.
+    The field is converted to a categorical, so the mapping is applied
+    to the unique names only and rows are updated through category codes
+    """
+    column = data[field].astype('category')
+    renamed = pd.Index([names.get(name, name) for name in column.cat.categories])
+    categories = renamed.unique().sort_values()
+    codes = remap_codes(column.cat.codes.to_numpy(), categories.get_indexer(renamed))
+    data[field] = pd.Categorical.from_codes(codes, categories)
     return data
 
 
-def get_combined_datasets(dataset_name, cutoff_date):
-    datasets = []
-    years = ['2020', '2021', '2022']
-    for year in years:
-        dataset = pd.read_csv(
-            'datasets/{}-{}.csv'.format(year, dataset_name),
-            delimiter=';',
-            decimal=',',
-            dtype={
-                c.MA: np.float32
-            }
-        )
-        dataset[c.DAY] = pd.to_datetime(dataset[c.DAY], format='%Y-%m-%d')
-        dataset[c.DATE_2019] = pd.to_datetime(dataset[c.DATE_2019], format='%Y-%m-%d')
-        if year == '2022':
-            dataset = dataset[
-                dataset[c.DAY].gt(
-                    pd.to_datetime(cutoff_date)
-                )
-            ]
-        datasets.append(dataset)
-    return pd.concat(datasets)
+def remap_codes(codes, new_codes):
+    """
+    Replaces category codes by new codes given for every old code,
+    missing values (-1) stay missing
+    """
+    return np.append(new_codes, -1).astype(np.int32)[codes]
 
 
-def upload_states_data():
-    states = get_combined_datasets('States', datetime.datetime(2021, 12, 24))
+def get_dataset_path(year, dataset_name):
+    return 'datasets/{}-{}.csv'.format(year, dataset_name)
+
+
+def get_dataset_paths(dataset_name):
+    """
+    Returns paths to the yearly files of a dataset
+    """
+    return [get_dataset_path(year, dataset_name) for year in YEARS]
 
+
+def read_daily_traffic_file(path):
+    """
+    Reads a file of the daily traffic variation dashboard
+    (states, ACCs or aircraft operators)
+    """
+    dataset = pd.read_csv(
+        path,
+        delimiter=';',
+        decimal=',',
+        dtype={
+            c.MA: np.float32
+        }
+    )
+    dataset[c.DAY] = pd.to_datetime(dataset[c.DAY], format='%Y-%m-%d')
+    dataset[c.DATE_2019] = pd.to_datetime(dataset[c.DATE_2019], format='%Y-%m-%d')
+    return dataset
+
+
+def get_combined_datasets(dataset_name):
+    """
+    Reads the yearly files of a dataset in parallel and concatenates
+    them in the order of years. Files overlap by a few months, a day
+    reported in several files is taken from the earliest one
+    """
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        datasets = list(executor.map(read_daily_traffic_file, get_dataset_paths(dataset_name)))
+    dataset = pd.concat(datasets)
+    return dataset.drop_duplicates(subset=[c.ENTITY, c.DAY], keep='first')
+
+
+def prepare_states_data(states):
     states = states.rename(
         columns={
             c.DAY: c.DATE
         }
     )
-    states = rename_state_names(states, c.ENTITY)
+    states = rename_entities(states, c.ENTITY, c.STATE_NAMES)
 
     states = states.set_index(c.ENTITY).join(
-        iso_codes.set_index(c.STATE_NAME),
+        get_dataset('iso_codes').set_index(c.STATE_NAME),
         on=c.ENTITY,
         how='left'
     )
@@ -69,9 +196,11 @@ def upload_states_data():
     return states
 
 
-def upload_area_centers_data():
-    area_centers = get_combined_datasets('ACCs', datetime.datetime(2021, 12, 24))
+def upload_states_data():
+    return prepare_states_data(get_combined_datasets('States'))
+
 
+def prepare_area_centers_data(area_centers):
     area_centers = area_centers.rename(
         columns={
             c.DAY: c.DATE,
@@ -79,21 +208,69 @@ def upload_area_centers_data():
             'State': c.STATE_NAME
         }
     )
-    area_centers = rename_state_names(area_centers, c.STATE_NAME)
+    area_centers = rename_entities(area_centers, c.STATE_NAME, c.STATE_NAMES)
     return area_centers
 
 
-def upload_airports_data():
-    airports = pd.read_csv(
-        'datasets/Airport_Traffic.csv',
+def upload_area_centers_data():
+    return prepare_area_centers_data(get_combined_datasets('ACCs'))
+
+
+def count_lines(path):
+    """
+    Returns number of lines in a file without parsing it
+    """
+    with open(path, 'rb') as file:
+        return sum(block.count(b'\n') for block in iter(lambda: file.read(1024 * 1024), b''))
+
+
+def get_sorted_categorical(codes, names):
+    """
+    Returns a categorical with categories in alphabetical order from
+    codes pointing to the names in order of their first appearance
+    """
+    names = np.array(names, dtype=object)
+    order = np.argsort(names, kind='stable')
+    ranks = np.empty(len(order), dtype=np.int32)
+    ranks[order] = np.arange(len(order))
+    return pd.Categorical.from_codes(remap_codes(codes, ranks), names[order])
+
+
+def upload_airports_data(path=AIRPORTS_PATH, start_date=None, end_date=None, states=None,
+                         airports=None, chunksize=AIRPORTS_CHUNK_SIZE):
+    """
+    Reads the airport traffic file chunk by chunk. Rows outside of the dates
+    or not in the lists of states and airports (ICAO codes) are dropped
+    from each chunk and the remaining rows are copied into arrays of the
+    final types allocated for the whole file. Flights are kept in one
+    2-d array, the layout pandas uses for columns of the same type, so the
+    dataframe is built around the arrays without copying them and memory
+    used while reading stays close to the size of the resulting dataset
+    """
+    dtypes = DATASET_DTYPES['airports']
+    text_columns = [c.MONTH_MON, c.AIRPORT_CODE, c.AIRPORT_NAME, c.STATE_NAME]
+    flight_columns = [column for column in dtypes if dtypes[column] == np.float32]
+    value_columns = [
+        column for column in dtypes
+        if column not in text_columns and column != c.ISO
+    ]
+
+    capacity = count_lines(path)
+    flights = np.empty((len(flight_columns), capacity), dtype=np.float32)
+    arrays = {column: flights[position] for position, column in enumerate(flight_columns)}
+    arrays.update({
+        column: np.empty(capacity, dtype=dtypes[column])
+        for column in value_columns if column not in flight_columns
+    })
+    # Codes of the names take 16 bits until a column has more names
+    arrays.update({column: np.empty(capacity, dtype=np.int16) for column in text_columns})
+    names = {column: {} for column in text_columns}
+    size = 0
+
+    chunks = pd.read_csv(
+        path,
         delimiter=';',
-        usecols=[
-            c.YEAR, c.MONTH_NUM, c.MONTH_MON,
-            c.DATE, c.AIRPORT_CODE, c.AIRPORT_NAME,
-            c.STATE_NAME, c.NM_DEP_FLIGHTS, c.NM_ARR_FLIGHTS,
-            c.NM_TOTAL_FLIGHTS, c.AIRPORT_DEP_FLIGHTS,
-            c.AIRPORT_ARR_FLIGHTS, c.AIRPORT_TOTAL_FLIGHTS
-        ],
+        usecols=value_columns + text_columns,
         dtype={
             c.YEAR: np.int32,
             c.MONTH_NUM: np.int32,
@@ -103,77 +280,621 @@ def upload_airports_data():
             c.AIRPORT_TOTAL_FLIGHTS: np.float32,
             c.AIRPORT_ARR_FLIGHTS: np.float32,
             c.AIRPORT_DEP_FLIGHTS: np.float32,
-        }
+        },
+        chunksize=chunksize
     )
+    for chunk in chunks:
+        chunk[c.DATE] = pd.to_datetime(chunk[c.DATE], format='%d/%m/%Y')
 
-    airports[c.DATE] = pd.to_datetime(airports[c.DATE], format='%d/%m/%Y')
+        selected = np.ones(len(chunk), dtype=bool)
+        if start_date is not None:
+            selected &= chunk[c.DATE].ge(pd.to_datetime(start_date)).to_numpy()
+        if end_date is not None:
+            selected &= chunk[c.DATE].le(pd.to_datetime(end_date)).to_numpy()
+        if states:
+            selected &= chunk[c.STATE_NAME].isin(states).to_numpy()
+        if airports:
+            selected &= chunk[c.AIRPORT_CODE].isin(airports).to_numpy()
+        if not selected.all():
+            chunk = chunk[selected]
 
-    airports = airports.set_index(c.STATE_NAME).join(
-        iso_codes.set_index(c.STATE_NAME),
-        on=c.STATE_NAME,
-        how='left'
-    )
-    airports = airports.reset_index()
-    return airports
+        end = size + len(chunk)
+        if end > capacity:
+            capacity = max(end, 2 * capacity)
+            flights = np.concatenate([flights, np.empty_like(flights)], axis=1)[:, :capacity]
+            for column in arrays:
+                if column in flight_columns:
+                    arrays[column] = flights[flight_columns.index(column)]
+                else:
+                    arrays[column] = np.resize(arrays[column], capacity)
 
+        for column in value_columns:
+            arrays[column][size:end] = chunk[column].to_numpy()
+        for column in text_columns:
+            codes, uniques = pd.factorize(chunk[column])
+            column_names = names[column]
+            new_codes = [column_names.setdefault(name, len(column_names)) for name in uniques]
+            if len(column_names) > np.iinfo(arrays[column].dtype).max:
+                arrays[column] = arrays[column].astype(np.int32)
+            arrays[column][size:end] = remap_codes(codes, np.array(new_codes, dtype=np.int32))
+        size = end
+    del chunk, chunks
 
-def upload_aircraft_operators_data():
+    # Arrays are cut to the read rows, they are copied only if most
+    # of them would be left unused (rows dropped by the filters)
+    trim = size < capacity * 0.9
+    data = pd.DataFrame(
+        (flights[:, :size].copy() if trim else flights[:, :size]).T,
+        columns=flight_columns,
+        copy=False
+    )
+    del flights
 
-    aircraft_operators = get_combined_datasets(
-        'Aircraft_Operators',
-        datetime.datetime(2021, 12, 31)
+    # Other columns are inserted in their place in front of the flights
+    columns = {}
+    for column in [column for column in value_columns if column not in flight_columns]:
+        values = arrays.pop(column)[:size]
+        columns[column] = values.copy() if trim else values
+    for column in text_columns:
+        columns[column] = get_sorted_categorical(arrays.pop(column)[:size], list(names[column]))
+
+    # ISO codes are joined to the states, not to every row
+    state_names = columns[c.STATE_NAME].categories
+    state_iso_codes = state_names.map(
+        get_dataset('iso_codes').set_index(c.STATE_NAME)[c.ISO]
+    )
+    iso_categories = pd.Index(state_iso_codes.dropna().unique()).sort_values()
+    columns[c.ISO] = pd.Categorical.from_codes(
+        remap_codes(columns[c.STATE_NAME].codes, iso_categories.get_indexer(state_iso_codes)),
+        iso_categories
     )
+    for position, column in enumerate(dtypes):
+        if column in columns:
+            data.insert(position, column, columns.pop(column))
+    return data
+
 
+def prepare_aircraft_operators_data(aircraft_operators):
     aircraft_operators = aircraft_operators.rename(
         columns={
             c.DAY: c.DATE
         }
     )
-    names_to_update = [
-        'Ryanair', 'easyJet', 'KLM', 'Wizz Air',
-        'SAS', 'SWISS', 'TAP', 'Aer Lingus',
-        'Air France', 'Eurowings', 'Iberia',
-        'British Airways'
-        ]
-    for name in names_to_update:
-        aircraft_operators[c.ENTITY] = aircraft_operators[c.ENTITY].str.replace(
-            '{}$'.format(name), '{} Group'.format(name), regex=True
-        )    
-    aircraft_operators[c.ENTITY] = aircraft_operators[c.ENTITY].str.replace(
-        'Lufthansa$', 'Lufthansa Airlines', regex=True
+    aircraft_operators = rename_entities(
+        aircraft_operators, c.ENTITY, c.AIRCRAFT_OPERATOR_NAMES
     )
-    aircraft_operators[c.ENTITY] = aircraft_operators[c.ENTITY].str.replace(
-        'DHL Express', 'DHL Group', regex=True
+    return aircraft_operators
+
+
+def upload_aircraft_operators_data():
+    return prepare_aircraft_operators_data(get_combined_datasets('Aircraft_Operators'))
+
+
+def get_baseline_2019_data(data, key):
+    """
+    Returns daily flights of 2019 of every value of the key column (aircraft
+    operator) taken from the reference flights (Day 2019 and Flights 2019)
+    of 2021 rows, sorted by date. Annual averages of the baseline are read
+    from its traffic cube (see calculations.get_baseline_averages)
+    """
+    rows = data[c.DATE].dt.year.eq(2021)
+    baseline = pd.DataFrame({
+        key: data.loc[rows, key],
+        c.DATE: data.loc[rows, c.DATE_2019],
+        c.FLIGHTS: data.loc[rows, c.FLIGHTS_2019]
+    })
+    baseline = baseline[baseline[c.DATE].dt.year.eq(2019)]
+    return sort_by_date(baseline)
+
+
+def get_aircraft_operators_2019_data(aircraft_operators):
+    return get_baseline_2019_data(aircraft_operators, c.ENTITY)
+
+
+def get_airport_dimension_data(airports):
+    """
+    Returns a table with one row per airport of the airport traffic
+    dataset indexed by ICAO code: name, state, ISO code and coordinates.
+    ID is a dense number of the airport (its position in the table).
+    Coordinates 0,0 used in the coordinates file for unknown airports
+    are treated as missing
+    """
+    dimensions = airports.groupby(c.AIRPORT_CODE, observed=True)[
+        [c.AIRPORT_NAME, c.STATE_NAME, c.ISO]
+    ].first().sort_index()
+    dimensions.index = pd.Index(np.asarray(dimensions.index, dtype=object), name=c.AIRPORT_CODE)
+
+    coordinates = pd.read_csv(AIRPORT_COORDINATES_PATH, delimiter=';', decimal=',')
+    coordinates = coordinates[coordinates['LAT'].ne(0) | coordinates['LONG'].ne(0)]
+    coordinates = coordinates.drop_duplicates(subset=c.AIRPORT_CODE)
+    dimensions = dimensions.join(
+        coordinates.set_index(c.AIRPORT_CODE)[['LAT', 'LONG']],
+        how='left'
     )
-    aircraft_operators[c.ENTITY] = aircraft_operators[c.ENTITY].str.replace(
-        'Aegean Airlines', 'AEGEAN Group', regex=True
+    dimensions.insert(0, 'ID', np.arange(len(dimensions), dtype=np.int32))
+    return dimensions
+
+
+# ----- Registry of datasets loaded on first use ----- #
+
+# Files every dataset is built from
+DATASET_SOURCES = {
+    'iso_codes': [ISO_CODES_PATH],
+    'states': get_dataset_paths('States') + [ISO_CODES_PATH],
+    'area_centers': get_dataset_paths('ACCs'),
+    'airports': [AIRPORTS_PATH, ISO_CODES_PATH],
+    'aircraft_operators': get_dataset_paths('Aircraft_Operators'),
+    'aircraft_operators_2019': get_dataset_paths('Aircraft_Operators'),
+    'airport_dimensions': [AIRPORTS_PATH, ISO_CODES_PATH, AIRPORT_COORDINATES_PATH],
+}
+
+
+def get_definitions_hash(*definitions):
+    """
+    Returns a hash of mappings and types a dataset is built with
+    """
+    text = json.dumps(definitions, sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# Parameters the cached datasets are built with, the cache is rebuilt
+# when the renamed entities or the types of the columns change
+DATASET_PARAMS = {
+    'states': {
+        'definitions': get_definitions_hash(c.STATE_NAMES, DATASET_DTYPES['states'])
+    },
+    'area_centers': {
+        'definitions': get_definitions_hash(c.STATE_NAMES, DATASET_DTYPES['area_centers'])
+    },
+    'airports': {
+        'filters': AIRPORTS_FILTERS,
+        'definitions': get_definitions_hash(DATASET_DTYPES['airports'])
+    },
+    'aircraft_operators': {
+        'definitions': get_definitions_hash(
+            c.AIRCRAFT_OPERATOR_NAMES, DATASET_DTYPES['aircraft_operators']
+        )
+    },
+}
+
+
+def load_iso_codes():
+    return pd.read_csv(ISO_CODES_PATH, delimiter=';')
+
+
+def load_states():
+    return data_cache.get_dataset(
+        'states',
+        DATASET_SOURCES['states'],
+        lambda: sort_by_date(
+            optimize_dtypes(upload_states_data(), DATASET_DTYPES['states'])
+        ),
+        params=DATASET_PARAMS['states']
     )
 
-    
-    return aircraft_operators
 
+def load_area_centers():
+    return data_cache.get_dataset(
+        'area_centers',
+        DATASET_SOURCES['area_centers'],
+        lambda: sort_by_date(
+            optimize_dtypes(upload_area_centers_data(), DATASET_DTYPES['area_centers'])
+        ),
+        params=DATASET_PARAMS['area_centers']
+    )
 
-def get_aircraft_operators_2019_data(aircraft_operators):
-    aircraft_operators_2021 = aircraft_operators[
-        aircraft_operators[c.DATE].dt.year.eq(2021)
-    ]
-    aircraft_operators_2019 = aircraft_operators_2021[[c.ENTITY, c.DATE_2019, c.FLIGHTS_2019]]
-    aircraft_operators_2019 = aircraft_operators_2019[
-        aircraft_operators_2019[c.DATE_2019].dt.year.eq(2019)
+
+def load_airports():
+    return data_cache.get_dataset(
+        'airports',
+        DATASET_SOURCES['airports'],
+        lambda: sort_by_date(optimize_dtypes(
+            upload_airports_data(**AIRPORTS_FILTERS),
+            DATASET_DTYPES['airports']
+        )),
+        params=DATASET_PARAMS['airports']
+    )
+
+
+def load_aircraft_operators():
+    return data_cache.get_dataset(
+        'aircraft_operators',
+        DATASET_SOURCES['aircraft_operators'],
+        lambda: sort_by_date(
+            optimize_dtypes(upload_aircraft_operators_data(), DATASET_DTYPES['aircraft_operators'])
+        ),
+        params=DATASET_PARAMS['aircraft_operators']
+    )
+
+
+def load_aircraft_operators_2019():
+    return get_aircraft_operators_2019_data(get_dataset('aircraft_operators'))
+
+
+def load_airport_dimensions():
+    return get_airport_dimension_data(get_dataset('airports'))
+
+
+LOADERS = {
+    'iso_codes': load_iso_codes,
+    'states': load_states,
+    'area_centers': load_area_centers,
+    'airports': load_airports,
+    'aircraft_operators': load_aircraft_operators,
+    'aircraft_operators_2019': load_aircraft_operators_2019,
+    'airport_dimensions': load_airport_dimensions,
+}
+
+# Datasets the dashboard needs, iso codes are loaded together with them
+DATASETS = [name for name in LOADERS if name != 'iso_codes']
+
+# Datasets built from another dataset, they are rebuilt on the next
+# request once rows are appended to the dataset they come from
+DERIVED_DATASETS = {
+    'aircraft_operators': ['aircraft_operators_2019'],
+    'airports': ['airport_dimensions'],
+}
+
+# Lookup structures of every dataset used by the callbacks (see indexes.py):
+# traffic cubes per key column, inverted indexes of the filtered columns
+# and columns labeling the keys. load_datasets builds them with the
+# datasets, so a master process shares them with its workers
+DATASET_INDEXES = {
+    'states': {
+        'cubes': [c.ENTITY],
+        'values': [c.ENTITY],
+        'labels': [(c.ENTITY, c.ISO)],
+    },
+    'area_centers': {
+        'cubes': [c.ACC],
+        'values': [c.ACC, c.STATE_NAME],
+        'labels': [(c.ACC, c.STATE_NAME)],
+    },
+    'airports': {
+        'cubes': [c.AIRPORT_CODE],
+        'values': [c.AIRPORT_CODE, c.AIRPORT_NAME, c.STATE_NAME],
+        'labels': [(c.AIRPORT_CODE, c.AIRPORT_NAME), (c.AIRPORT_CODE, c.STATE_NAME)],
+    },
+    'aircraft_operators': {
+        'cubes': [c.ENTITY],
+        'values': [c.ENTITY],
+    },
+    'aircraft_operators_2019': {
+        'cubes': [c.ENTITY],
+        'values': [c.ENTITY],
+    },
+}
+
+datasets = {}
+dataset_locks = {name: threading.RLock() for name in LOADERS}
+
+
+def get_dataset(name):
+    """
+    Returns a dataset by its name. The dataset is loaded the first time
+    it is requested, concurrent requests wait for the same load.
+    Rows queued for the dataset (see queue_dataset_file) are appended to it
+    """
+    data = datasets.get(name)
+    if data is None:
+        with dataset_locks[name]:
+            data = datasets.get(name)
+            if data is None:
+                data = apply_queued_files(name, LOADERS[name]())
+                datasets[name] = data
+    return data
+
+
+def get_dataset_signature(name):
+    """
+    Returns a string identifying content of a dataset in every process of
+    the app. It changes with the source files, the parameters (DATASET_PARAMS),
+    the version of data_cache and the files queued for the dataset or the one
+    it is derived from. Once rows are appended to the dataset directly in
+    a process (append_dataset_rows) the signature is specific to that process
+    """
+    files = []
+    for path in DATASET_SOURCES[name]:
+        stat = os.stat(path)
+        files.append([path, stat.st_size, stat.st_mtime_ns])
+    names = [name] + [source for source, derived in DERIVED_DATASETS.items() if name in derived]
+    # Files queued for a dataset which is not loaded yet are applied on its load
+    appended = [
+        [entry['file'] for entry in queued_files if entry['name'] == source]
+        for source in names
     ]
-    aircraft_operators_2019 = aircraft_operators_2019.rename(
-        columns={
-            c.DATE_2019: c.DATE,
-            c.FLIGHTS_2019: c.FLIGHTS
-        }
+    local = [local_appends[source] for source in names]
+    if any(local):
+        appended.append([os.getpid()] + local)
+    elif not any(appended):
+        appended = None
+    params = [DATASET_PARAMS.get(source) for source in names]
+    signature = json.dumps([files, params, data_cache.CACHE_VERSION, appended])
+    return hashlib.sha256(signature.encode()).hexdigest()
+
+
+def get_date_range(name, load=False):
+    """
+    Returns first and last date of a dataset. A dataset which is not loaded
+    yet is not read for them, they are taken from the manifest of its cache.
+    If they are not known there (no valid cache or queued appends) the
+    dataset is loaded when load is True, otherwise None is returned
+    """
+    data = datasets.get(name)
+    if data is None and not get_pending_files(name):
+        date_range = data_cache.get_date_range(
+            name, c.DATE, DATASET_SOURCES[name], DATASET_PARAMS.get(name)
+        )
+        if date_range is not None:
+            return date_range
+    if data is None:
+        if not load:
+            return None
+        data = get_dataset(name)
+    return [data[c.DATE].min(), data[c.DATE].max()]
+
+
+def build_indexes(name):
+    """
+    Builds the lookup structures of a loaded dataset (see DATASET_INDEXES),
+    structures built before are kept
+    """
+    if name not in DATASET_INDEXES:
+        return
+    data = get_dataset(name)
+    spec = DATASET_INDEXES[name]
+    indexes.get_sorted_dates(data)
+    for column in spec.get('values', []):
+        indexes.get_value_index(data, column)
+    for key in spec.get('cubes', []):
+        indexes.get_cube(data, key)
+    for key, column in spec.get('labels', []):
+        indexes.get_key_labels(data, key, column)
+
+
+def load_datasets(names=None):
+    """
+    Loads all datasets (or the given ones) which are not loaded yet
+    and builds their lookup structures. Datasets are built in parallel,
+    a dataset derived from another one waits for it in get_dataset
+    """
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        list(executor.map(get_dataset, names or DATASETS))
+        list(executor.map(build_indexes, names or DATASETS))
+
+
+def prewarm_datasets(names=None):
+    """
+    Starts loading of the datasets in a background thread
+    """
+    thread = threading.Thread(
+        target=load_datasets,
+        args=(names,),
+        name='prewarm-datasets',
+        daemon=True
     )
-    return aircraft_operators_2019
+    thread.start()
+    return thread
+
+
+# ----- Incremental update of loaded datasets ----- #
 
+# Columns identifying a row of a dataset
+DATASET_KEYS = {
+    'states': [c.ENTITY, c.DATE],
+    'area_centers': [c.ACC, c.DATE],
+    'airports': [c.AIRPORT_CODE, c.DATE],
+    'aircraft_operators': [c.ENTITY, c.DATE],
+}
 
-iso_codes = pd.read_csv('datasets/iso_codes.csv', delimiter=';')
+PREPARE_FUNCTIONS = {
+    'states': prepare_states_data,
+    'area_centers': prepare_area_centers_data,
+    'aircraft_operators': prepare_aircraft_operators_data,
+}
 
-states = upload_states_data()
-area_centers = upload_area_centers_data()
-airports = upload_airports_data()
-aircraft_operators = upload_aircraft_operators_data()
-aircraft_operators_2019 = get_aircraft_operators_2019_data(aircraft_operators)
\ No newline at end of file
+
+def read_dataset_file(name, path):
+    """
+    Reads a file with new rows of a dataset. The file has the same
+    format as the source files of the dataset
+    """
+    if name == 'airports':
+        return upload_airports_data(path, **AIRPORTS_FILTERS)
+    return PREPARE_FUNCTIONS[name](read_daily_traffic_file(path))
+
+
+def validate_rows(name, rows):
+    """
+    Checks that new rows of a dataset have all the columns used by the
+    dashboard and a complete key, returns the rows with the dataset types
+    """
+    missing_columns = [column for column in DATASET_DTYPES[name] if column not in rows.columns]
+    if missing_columns:
+        raise ValueError(
+            'Rows of {} have no columns: {}'.format(name, ', '.join(missing_columns))
+        )
+    if rows[DATASET_KEYS[name]].isna().any(axis=None):
+        raise ValueError(
+            'Rows of {} have empty values in {}'.format(name, ', '.join(DATASET_KEYS[name]))
+        )
+    return optimize_dtypes(rows, DATASET_DTYPES[name])
+
+
+def concat_datasets(datasets):
+    """
+    Concatenates datasets keeping categorical columns, categories of the
+    result are the sorted union of the categories of all datasets
+    """
+    first = datasets[0]
+    for column in first.columns:
+        if pd.api.types.is_categorical_dtype(first[column]):
+            categories = pd.Index(
+                np.concatenate([data[column].cat.categories for data in datasets])
+            ).unique().sort_values()
+            datasets = [
+                data.assign(**{column: data[column].cat.set_categories(categories)})
+                for data in datasets
+            ]
+    return pd.concat(datasets, ignore_index=True)
+
+
+def combine_rows(data, rows, keys, replace=False):
+    """
+    Appends rows to a dataset. A row whose key is already in the dataset
+    is skipped, or replaces the existing row if replace is True
+    """
+    rows = rows.drop_duplicates(subset=keys, keep='last')
+    overlapping = data[c.DATE].between(rows[c.DATE].min(), rows[c.DATE].max()).to_numpy()
+    existing_keys = pd.MultiIndex.from_frame(data.loc[overlapping, keys].astype(object))
+    new_keys = pd.MultiIndex.from_frame(rows[keys].astype(object))
+
+    if replace:
+        kept = np.ones(len(data), dtype=bool)
+        kept[np.flatnonzero(overlapping)[existing_keys.isin(new_keys)]] = False
+        data = data[kept]
+    else:
+        rows = rows[~new_keys.isin(existing_keys)]
+    return sort_by_date(concat_datasets([data, rows])), len(rows)
+
+
+def append_dataset_rows(name, rows, replace=False, queued_file=None):
+    """
+    Appends new rows to a loaded dataset without reloading it. The rows
+    are validated and rows with a key (name and day) already present are
+    skipped, or replace the existing ones if replace is True.
+    Datasets derived from the dataset are rebuilt on their next request.
+    Every append copies the whole dataset and its lookup structures are
+    built again on their next use. queued_file is the name of the queued
+    file the rows come from (see queue_dataset_file).
+    Returns number of added rows
+    """
+    rows = validate_rows(name, rows)
+    with dataset_locks[name]:
+        data, count = combine_rows(get_dataset(name), rows, DATASET_KEYS[name], replace)
+        datasets[name] = data
+        if queued_file is None:
+            local_appends[name] += 1
+        else:
+            applied_files[name].append(queued_file)
+    for derived_name in DERIVED_DATASETS.get(name, []):
+        with dataset_locks[derived_name]:
+            datasets.pop(derived_name, None)
+    return count
+
+
+def append_dataset_file(name, path, replace=False, queued_file=None):
+    """
+    Appends rows from a file in the format of the source files of a dataset
+    """
+    return append_dataset_rows(name, read_dataset_file(name, path), replace, queued_file)
+
+
+# ----- Appends applied by every process of the app ----- #
+#
+# append_dataset_file changes the datasets of one process only. Files queued
+# by queue_dataset_file (python append_dataset.py) are copied into APPENDS_DIR
+# and listed in a journal, every process appends the listed files it has
+# not applied yet: loaded datasets when check_queued_appends finds new entries
+# (the app checks before requests), other datasets once they are loaded.
+# The journal is kept across restarts, it can be removed together with the
+# copied files once the source files of the datasets hold the rows.
+
+APPENDS_DIR = os.path.join(data_cache.CACHE_DIR, 'appends')
+APPENDS_JOURNAL = os.path.join(APPENDS_DIR, 'journal.jsonl')
+
+# The journal is read at most once in this number of seconds
+APPENDS_CHECK_INTERVAL = float(os.environ.get('APPENDS_CHECK_INTERVAL', '5'))
+
+# Queued files appended to every dataset in this process and number
+# of appends done directly with append_dataset_rows
+applied_files = {name: [] for name in LOADERS}
+local_appends = {name: 0 for name in LOADERS}
+
+appends_checked_at = time.monotonic()
+
+
+def read_queued_files():
+    """
+    Returns entries of the journal (dataset name, file and replace flag),
+    a line which is still being written is skipped
+    """
+    try:
+        with open(APPENDS_JOURNAL) as file:
+            return [json.loads(line) for line in file if line.endswith('\n')]
+    except OSError:
+        return []
+
+
+queued_files = read_queued_files()
+
+
+def get_pending_files(name):
+    """
+    Returns journal entries of a dataset not applied in this process
+    """
+    entries = [entry for entry in queued_files if entry['name'] == name]
+    return entries[len(applied_files[name]):]
+
+
+def apply_queued_files(name, data):
+    """
+    Appends files queued for a dataset to the dataset being loaded
+    """
+    for entry in get_pending_files(name):
+        rows = validate_rows(name, read_dataset_file(name, os.path.join(APPENDS_DIR, entry['file'])))
+        data, _ = combine_rows(data, rows, DATASET_KEYS[name], entry['replace'])
+        applied_files[name].append(entry['file'])
+    return data
+
+
+def apply_queued_appends():
+    """
+    Reads the journal and appends new files to the loaded datasets,
+    returns number of appended files
+    """
+    global queued_files
+    queued_files = read_queued_files()
+    count = 0
+    for name in DATASET_KEYS:
+        if name not in datasets:
+            continue
+        with dataset_locks[name]:
+            for entry in get_pending_files(name):
+                path = os.path.join(APPENDS_DIR, entry['file'])
+                append_dataset_file(name, path, entry['replace'], entry['file'])
+                count += 1
+    return count
+
+
+def check_queued_appends():
+    """
+    Applies new entries of the journal if it was not read in the last
+    APPENDS_CHECK_INTERVAL seconds, returns number of appended files
+    """
+    global appends_checked_at
+    now = time.monotonic()
+    if now - appends_checked_at < APPENDS_CHECK_INTERVAL:
+        return 0
+    appends_checked_at = now
+    return apply_queued_appends()
+
+
+def queue_dataset_file(name, path, replace=False):
+    """
+    Queues a file in the format of the source files of a dataset to be
+    appended by every process of the app. The file is checked and copied,
+    so it can be removed afterwards. Returns number of rows of the file
+    """
+    rows = validate_rows(name, read_dataset_file(name, path))
+    os.makedirs(APPENDS_DIR, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(
+        dir=APPENDS_DIR, prefix='{}-'.format(name), suffix=os.path.splitext(path)[1]
+    )
+    os.close(descriptor)
+    shutil.copyfile(path, temp_path)
+    entry = {'name': name, 'file': os.path.basename(temp_path), 'replace': replace}
+    # Lines appended with a single write are not mixed with other writers
+    with open(APPENDS_JOURNAL, 'a') as file:
+        file.write(json.dumps(entry) + '\n')
+    return len(rows)
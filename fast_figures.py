@@ -0,0 +1,102 @@
+import os
+import types
+import functools
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+import plotly.colors
+
+# ----- Figures built as plain dictionaries ----- #
+#
+# Drop-in replacement of the parts of plotly.graph_objects used by the app.
+# Figures are dictionaries of NumPy arrays, no property is validated, so
+# a figure is built in a fraction of the time. Dash encodes them like other
+# figures, with orjson (which serializes arrays natively) when it is installed.
+# Names of properties with an underscore set nested properties, like magic
+# underscores of Plotly (marker_color sets color of the marker).
+# FAST_FIGURES=1 makes app.py use it, see benchmark_figures.py.
+
+FAST_FIGURES = os.environ.get('FAST_FIGURES', '0') == '1'
+
+
+def to_plotly_value(value):
+    """
+    Returns pandas objects as arrays and NumPy numbers as Python numbers
+    """
+    if isinstance(value, (pd.Series, pd.Index)):
+        return value.to_numpy()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def set_properties(target, properties):
+    """
+    Sets properties given as keyword arguments of Plotly constructors
+    in a dictionary, dictionaries are merged with existing ones
+    """
+    for name, value in properties.items():
+        *parents, last = name.split('_')
+        node = target
+        for parent in parents:
+            node = node.setdefault(parent, {})
+        value = to_plotly_value(value)
+        if last == 'colorscale' and isinstance(value, str):
+            value = plotly.colors.get_colorscale(value)
+        if isinstance(value, dict) and isinstance(node.get(last), dict):
+            set_properties(node[last], value)
+        elif isinstance(value, dict):
+            node[last] = set_properties({}, value)
+        else:
+            node[last] = value
+    return target
+
+
+@functools.lru_cache(maxsize=None)
+def get_template():
+    """
+    Returns the default Plotly template, added to every figure
+    as go.Figure does
+    """
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def build_trace(trace_type):
+    def trace(**properties):
+        return set_properties({'type': trace_type}, properties)
+    return trace
+
+
+Bar = build_trace('bar')
+Scatter = build_trace('scatter')
+Choroplethmapbox = build_trace('choroplethmapbox')
+Scattermapbox = build_trace('scattermapbox')
+scattermapbox = types.SimpleNamespace(Marker=lambda **properties: set_properties({}, properties))
+
+
+class Figure:
+    """
+    Figure with the methods of plotly Figure used by the app
+    """
+    def __init__(self, data=None, layout=None):
+        self.data = [data] if isinstance(data, dict) else list(data or [])
+        self.layout = set_properties({'template': get_template()}, layout or {})
+
+    def add_trace(self, trace):
+        self.data.append(trace)
+        return self
+
+    def update_layout(self, **properties):
+        set_properties(self.layout, properties)
+        return self
+
+    def update_xaxes(self, **properties):
+        set_properties(self.layout.setdefault('xaxis', {}), properties)
+        return self
+
+    def update_yaxes(self, **properties):
+        set_properties(self.layout.setdefault('yaxis', {}), properties)
+        return self
+
+    def to_plotly_json(self):
+        return {'data': self.data, 'layout': self.layout}
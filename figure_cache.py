@@ -0,0 +1,220 @@
+import os
+import json
+import glob
+import time
+import hashlib
+import inspect
+import tempfile
+import functools
+import plotly.io as pio
+import dash
+from dash.exceptions import MissingCallbackContextException
+import data_cache
+import data_load
+import result_cache
+
+# ----- Figures cache shared by all processes of the app ----- #
+#
+# Figures returned by callbacks are stored as json files in a local
+# directory, so that every gunicorn worker (and every app restart) can
+# serve a figure calculated by another one without running pandas or
+# Plotly. A figure is found by the callback, its inputs (normalized the
+# same way as in result_cache) and the signatures of the datasets it is
+# built from (see data_load.get_dataset_signature), together with the
+# source of the callback and of the modules the figures are built with
+# (FIGURE_MODULES), the versions of the map geometry files referred to by
+# the figures, the settings changing figures (FIGURE_SETTINGS) and
+# CACHE_VERSION, so figures of an older code or configuration of the app
+# are not served. CACHE_VERSION is raised when the figures change for
+# another reason, e.g. a new version of Plotly.
+# Files are replaced atomically, figures older than CACHE_TTL seconds are
+# not used and the oldest files are removed once the directory takes
+# more than CACHE_BYTES.
+
+CACHE_DIR = os.environ.get('FIGURE_CACHE_DIR', os.path.join(data_cache.CACHE_DIR, 'figures'))
+CACHE_ENABLED = os.environ.get('FIGURE_CACHE', '1') != '0'
+CACHE_TTL = int(os.environ.get('FIGURE_CACHE_TTL', str(24 * 60 * 60)))
+CACHE_BYTES = int(os.environ.get('FIGURE_CACHE_BYTES', str(256 * 1024 * 1024)))
+
+CACHE_VERSION = 1
+
+# Environment variables of the app which change the figures
+FIGURE_SETTINGS = ['TRACE_POINTS', 'MAP_GEOJSON', 'FAST_FIGURES']
+
+# Modules of the calculations and figures shared by the callbacks
+FIGURE_MODULES = ['calculations.py', 'indexes.py', 'fast_figures.py', 'constants.py']
+
+# Assets whose urls with versions are embedded in the figures (see app.get_map_geometry)
+FIGURE_ASSETS = 'assets/custom_map*.json'
+
+# Size of the directory is checked after this number of written figures
+CHECK_INTERVAL = 100
+
+writes_since_check = 0
+
+
+def normalize_input(name, value):
+    """
+    Returns json serializable value of an input of a callback.
+    All lists of the dashboard inputs are sets of selected values
+    """
+    if isinstance(value, (list, tuple)) or value is None:
+        return result_cache.normalize_selection(value)
+    if name in result_cache.DATE_ARGUMENTS:
+        return result_cache.normalize_date(value)
+    return value
+
+
+def is_zoom_update():
+    """
+    Checks if a callback is triggered by a zoom of its chart (relayoutData).
+    A function called outside of a callback is taken as zoomed
+    """
+    try:
+        triggered = dash.callback_context.triggered
+    except MissingCallbackContextException:
+        return True
+    props = [trigger['prop_id'] for trigger in triggered or []]
+    return bool(props) and all(prop.endswith('.relayoutData') for prop in props)
+
+
+def get_source_hash(function):
+    """
+    Returns a hash of the source code of a callback
+    """
+    try:
+        source = inspect.getsource(function)
+    except (OSError, TypeError):
+        source = ''
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def get_modules_hash():
+    """
+    Returns a hash of the source code of FIGURE_MODULES
+    """
+    modules_hash = hashlib.sha256()
+    for name in FIGURE_MODULES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), name), 'rb') as file:
+            modules_hash.update(file.read())
+    return modules_hash.hexdigest()
+
+
+# Sources do not change while the app runs
+MODULES_HASH = get_modules_hash()
+
+
+def get_asset_versions():
+    """
+    Returns modification times of FIGURE_ASSETS, the versions in their urls
+    """
+    return [[path, int(os.path.getmtime(path))] for path in sorted(glob.glob(FIGURE_ASSETS))]
+
+
+def get_figure_path(callback_id, inputs, datasets):
+    key = json.dumps([
+        CACHE_VERSION,
+        MODULES_HASH,
+        get_asset_versions(),
+        callback_id,
+        [[name, os.environ.get(name)] for name in FIGURE_SETTINGS],
+        inputs,
+        [data_load.get_dataset_signature(name) for name in datasets]
+    ])
+    return os.path.join(CACHE_DIR, '{}.json'.format(hashlib.sha256(key.encode()).hexdigest()))
+
+
+def read_figure(path):
+    """
+    Returns a stored figure as a dictionary or None if there is no
+    figure or it is older than CACHE_TTL
+    """
+    try:
+        if time.time() - os.path.getmtime(path) > CACHE_TTL:
+            return None
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_figure(path, figure):
+    """
+    Stores a figure, the file is replaced atomically so that other
+    processes never read a partially written figure
+    """
+    global writes_since_check
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(pio.to_json(figure, validate=False))
+        os.replace(temp_path, path)
+    except (OSError, ValueError):
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return
+    writes_since_check += 1
+    if writes_since_check >= CHECK_INTERVAL:
+        writes_since_check = 0
+        remove_old_figures()
+
+
+def remove_old_figures():
+    """
+    Removes expired figures and, if the cache is still larger than
+    CACHE_BYTES, the oldest ones
+    """
+    figures = []
+    for entry in os.scandir(CACHE_DIR):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        figures.append((stat.st_mtime, stat.st_size, entry.path))
+    figures.sort()
+
+    total_size = sum(size for _, size, _ in figures)
+    now = time.time()
+    for mtime, size, path in figures:
+        if total_size <= CACHE_BYTES and now - mtime <= CACHE_TTL:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total_size -= size
+
+
+def cached_figure(*datasets, zoom_argument=None):
+    """
+    Decorator of a callback returning a figure built from the given
+    datasets, the figure is taken from the cache if it is there.
+    zoom_argument is the relayoutData of a chart, it is a part of the key
+    only when the zoom triggers the callback (see is_zoom_update)
+    """
+    def decorator(function):
+        signature = inspect.signature(function)
+        callback_id = '{}.{}:{}'.format(
+            function.__module__, function.__qualname__, get_source_hash(function)
+        )
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not CACHE_ENABLED:
+                return function(*args, **kwargs)
+            arguments = signature.bind(*args, **kwargs)
+            inputs = [
+                [name, normalize_input(name, value)]
+                for name, value in arguments.arguments.items()
+                if name != zoom_argument or is_zoom_update()
+            ]
+            path = get_figure_path(callback_id, inputs, datasets)
+            figure = read_figure(path)
+            if figure is None:
+                figure = function(*args, **kwargs)
+                write_figure(path, figure)
+            return figure
+
+        return wrapper
+    return decorator
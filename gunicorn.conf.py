@@ -0,0 +1,31 @@
+import os
+import gc
+
+# Gunicorn reads this file from the working directory on start up.
+# Datasets are loaded by each worker when a callback needs them for the
+# first time. With PREWARM_DATASETS=1 the worker starts loading all of them
+# in the background as soon as it is ready to accept requests.
+#
+# With SHARED_DATASETS=1 the app, all the datasets and their lookup
+# structures (cubes, value indexes, sorted dates) are built once by the
+# master process before it forks the workers. Workers then share these
+# memory pages with the master instead of holding their own copies (use worker_memory.py to check the memory of each worker).
+
+shared_datasets = os.environ.get('SHARED_DATASETS', '0') == '1'
+preload_app = shared_datasets
+
+
+def when_ready(server):
+    if shared_datasets:
+        import data_load
+        data_load.load_datasets()
+        # Objects created so far are moved out of reach of the garbage
+        # collector, otherwise collections in the workers would write to
+        # their headers and make private copies of the shared pages
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    if os.environ.get('PREWARM_DATASETS', '0') == '1' and not shared_datasets:
+        import data_load
+        data_load.prewarm_datasets()
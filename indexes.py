@@ -0,0 +1,263 @@
+import weakref
+import numpy as np
+import pandas as pd
+import constants as c
+
+# ----- Lookup structures built once per dataset ----- #
+#
+# Structures derived from a dataset (sorted dates, row positions of every
+# name ...) are kept for as long as the dataset object is alive.
+# Loaded datasets are never changed in place, appending rows creates
+# a new dataset, so its structures are built again on their first use.
+
+data_indexes = {}
+
+
+def get_index(data, name, builder):
+    """
+    Returns a structure of a dataset built by builder(data),
+    the structure is built the first time it is requested
+    """
+    key = id(data)
+    entry = data_indexes.get(key)
+    if entry is None or entry[0]() is not data:
+        def remove_entry(reference):
+            if key in data_indexes and data_indexes[key][0] is reference:
+                del data_indexes[key]
+        entry = (weakref.ref(data, remove_entry), {})
+        data_indexes[key] = entry
+    indexes = entry[1]
+    if name not in indexes:
+        indexes[name] = builder(data)
+    return indexes[name]
+
+
+def build_sorted_dates(data):
+    """
+    Returns dates of a dataset as an array if the dataset is sorted
+    by date, otherwise None
+    """
+    if not data[c.DATE].is_monotonic_increasing:
+        return None
+    return data[c.DATE].to_numpy()
+
+
+def get_sorted_dates(data):
+    return get_index(data, 'sorted_dates', build_sorted_dates)
+
+
+def search_dates(dates, start_date, end_date):
+    """
+    Returns positions of the first and after the last of sorted dates
+    between start and end date (both included).
+    Missing dates mean the first or the last date
+    """
+    start = 0 if start_date is None else np.searchsorted(dates, np.datetime64(start_date), 'left')
+    end = len(dates) if end_date is None else np.searchsorted(dates, np.datetime64(end_date), 'right')
+    return start, end
+
+
+def get_date_range(data, start_date, end_date):
+    """
+    Returns positions of the first and after the last row of a dataset
+    sorted by date with a date between start and end date
+    """
+    return search_dates(get_sorted_dates(data), start_date, end_date)
+
+
+def build_value_index(values):
+    """
+    Returns an inverted index of a column: unique values, codes of the
+    rows and positions of the rows grouped by value. Rows of a value
+    are order[offsets[code]:offsets[code + 1]], in ascending order
+    """
+    if pd.api.types.is_categorical_dtype(values):
+        codes = values.cat.codes.to_numpy()
+        categories = values.cat.categories
+    else:
+        codes, categories = pd.factorize(values)
+    order = np.argsort(codes, kind='stable')
+    offsets = np.searchsorted(codes[order], np.arange(len(categories) + 1))
+    return categories, codes, order, offsets
+
+
+def get_value_index(data, column):
+    return get_index(data, ('values', column), lambda data: build_value_index(data[column]))
+
+
+def get_value_codes(categories, values):
+    codes = categories.get_indexer(pd.Index(values).unique())
+    return codes[codes >= 0]
+
+
+def get_row_positions(data, filters):
+    """
+    Returns ascending positions of the rows of a dataset whose columns
+    have one of the given values, filters is a dictionary of columns and
+    lists of values. Rows of the values of the first column are gathered
+    from the inverted index, other columns are checked on these rows only
+    """
+    columns = list(filters)
+    categories, _, order, offsets = get_value_index(data, columns[0])
+    positions = [
+        order[offsets[code]:offsets[code + 1]]
+        for code in get_value_codes(categories, filters[columns[0]])
+    ]
+    if len(positions) == 1:
+        positions = positions[0]
+    else:
+        positions = np.sort(np.concatenate(positions + [np.array([], dtype=order.dtype)]))
+
+    for column in columns[1:]:
+        categories, codes, _, _ = get_value_index(data, column)
+        positions = positions[
+            np.isin(codes[positions], get_value_codes(categories, filters[column]))
+        ]
+    return positions
+
+
+# Columns with daily traffic stored in the cubes
+CUBE_COLUMNS = [
+    c.FLIGHTS, c.FLIGHTS_2019, c.FLIGHTS_2020, c.MA,
+    c.NM_DEP_FLIGHTS, c.NM_ARR_FLIGHTS, c.NM_TOTAL_FLIGHTS,
+    c.AIRPORT_DEP_FLIGHTS, c.AIRPORT_ARR_FLIGHTS, c.AIRPORT_TOTAL_FLIGHTS,
+]
+
+
+def get_cumulative(cells, shape, weights=None):
+    """
+    Returns cumulative sums over days of the weights (or of the number)
+    of the rows in the cells of a cube, with a leading column of zeros
+    """
+    totals = np.bincount(cells, weights=weights, minlength=shape[0] * shape[1])
+    cumulative = np.zeros((shape[0], shape[1] + 1), dtype=np.float64 if weights is not None else np.int32)
+    np.cumsum(totals.reshape(shape), axis=1, out=cumulative[:, 1:])
+    return cumulative
+
+
+def build_cube(data, key):
+    """
+    Returns traffic of a dataset as dense arrays with a row for every
+    value of the key column (entity, ACC ...) and a column for every day.
+    The arrays are cumulative over days: for every traffic column there are
+    running totals of the values and of the number of values (days with
+    a missing value are not counted), rows has running numbers of rows
+    of the dataset. Totals of any period are then a difference of two
+    columns of the arrays (see get_period_totals)
+    """
+    keys, key_codes, _, _ = get_value_index(data, key)
+    dates = data[c.DATE].to_numpy()
+    valid = (key_codes >= 0) & ~np.isnat(dates)
+    days, day_codes = np.unique(dates[valid], return_inverse=True)
+    cells = key_codes[valid].astype(np.int64) * len(days) + day_codes
+    shape = (len(keys), len(days))
+
+    cube = {
+        'keys': keys,
+        'days': days,
+        'rows': get_cumulative(cells, shape),
+        'values': {},
+        'counts': {},
+        'dtypes': {},
+    }
+    for column in CUBE_COLUMNS:
+        if column not in data.columns:
+            continue
+        cube['dtypes'][column] = data[column].dtype
+        values = data[column].to_numpy(dtype=np.float64)[valid]
+        known = ~np.isnan(values)
+        if known.all():
+            cube['values'][column] = get_cumulative(cells, shape, values)
+            cube['counts'][column] = cube['rows']
+        else:
+            cube['values'][column] = get_cumulative(cells[known], shape, values[known])
+            cube['counts'][column] = get_cumulative(cells[known], shape)
+    return cube
+
+
+def get_period_totals(cumulative, rows, start, end):
+    """
+    Returns totals of the given rows of a cumulative cube array
+    over days from start to end (excluded)
+    """
+    return cumulative[rows, end] - cumulative[rows, start]
+
+
+def get_period_averages(cube, column, rows, start, end):
+    """
+    Returns daily averages of a column of the cube for the given rows over
+    days from start to end (excluded) and the number of days with a value,
+    averages of rows without values are NaN
+    """
+    counts = get_period_totals(cube['counts'][column], rows, start, end)
+    sums = get_period_totals(cube['values'][column], rows, start, end)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts, counts
+
+
+def get_daily_totals(cumulative, rows, start, end):
+    """
+    Returns totals over the given rows of a cumulative cube array
+    for every day from start to end (excluded)
+    """
+    return np.diff(cumulative[rows, start:end + 1].sum(axis=0))
+
+
+def get_rolling_means(values, window=7):
+    """
+    Returns moving averages over the last window values along the last
+    axis of an array, so many series (rows of a 2-d array) are averaged
+    at once. Averages are differences of running totals; like pandas
+    rolling with min_periods=1, missing values are skipped and the first
+    averages are taken over the values available so far
+    """
+    values = np.asarray(values, dtype=np.float64)
+    known = ~np.isnan(values)
+    shape = values.shape[:-1] + (values.shape[-1] + 1,)
+    sums = np.zeros(shape)
+    counts = np.zeros(shape, dtype=np.int64)
+    np.cumsum(np.where(known, values, 0), axis=-1, out=sums[..., 1:])
+    np.cumsum(known, axis=-1, out=counts[..., 1:])
+
+    ends = np.arange(1, shape[-1])
+    starts = np.maximum(ends - window, 0)
+    window_counts = counts[..., ends] - counts[..., starts]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (sums[..., ends] - sums[..., starts]) / window_counts
+    means[window_counts == 0] = np.nan
+    return means
+
+
+def get_cube(data, key):
+    return get_index(data, ('cube', key), lambda data: build_cube(data, key))
+
+
+def build_key_labels(data, key, column):
+    """
+    Returns values of a column for every value of the key column,
+    e.g. the ISO code of every state
+    """
+    return data.groupby(key, observed=True)[column].first()
+
+
+def get_key_labels(data, key, column):
+    return get_index(data, ('labels', key, column), lambda data: build_key_labels(data, key, column))
+
+
+def get_cube_rows(data, key, filters=None):
+    """
+    Returns positions of the cube rows of the values of the key column
+    selected by filters, a dictionary of lists of values of the key column
+    or of the columns labeling it (see get_key_labels)
+    """
+    keys = get_cube(data, key)['keys']
+    rows = np.argsort(keys)
+    for column, values in (filters or {}).items():
+        if not values:
+            continue
+        if column == key:
+            labels = keys[rows]
+        else:
+            labels = pd.Index(get_key_labels(data, key, column).reindex(keys[rows]))
+        rows = rows[labels.isin(values)]
+    return rows
@@ -0,0 +1,104 @@
+"""
+Prints memory usage of every column of the datasets as they are read by
+a plain pd.read_csv of their csv files and after the conversion to compact
+types done by data_load (names, such as the renamed states, are compared
+too). Columns of the files are named as in the dashboard. The airport
+traffic file is compacted while it is read, the peak of memory allocated
+by the chunked read is printed with its report.
+
+Usage: python memory_report.py [states] [area_centers] [airports] [aircraft_operators]
+"""
+import sys
+import tracemalloc
+import pandas as pd
+import constants as c
+import data_load
+
+
+# Source files of the daily traffic datasets and names of their columns
+# in the dashboard
+DATASET_FILES = {
+    'states': 'States',
+    'area_centers': 'ACCs',
+    'aircraft_operators': 'Aircraft_Operators',
+}
+
+COLUMN_NAMES = {
+    'states': {c.DAY: c.DATE},
+    'area_centers': {c.DAY: c.DATE, c.ENTITY: c.ACC, 'State': c.STATE_NAME},
+    'aircraft_operators': {c.DAY: c.DATE},
+}
+
+BUILD_FUNCTIONS = {
+    'states': data_load.upload_states_data,
+    'area_centers': data_load.upload_area_centers_data,
+    'aircraft_operators': data_load.upload_aircraft_operators_data,
+}
+
+DATASETS = ['states', 'area_centers', 'airports', 'aircraft_operators']
+
+
+def read_raw_dataset(name):
+    """
+    Returns the source files of a dataset read at once by pd.read_csv,
+    without any conversion
+    """
+    if name == 'airports':
+        return pd.read_csv(data_load.AIRPORTS_PATH, delimiter=';')
+    return pd.concat([
+        pd.read_csv(path, delimiter=';', decimal=',')
+        for path in data_load.get_dataset_paths(DATASET_FILES[name])
+    ], ignore_index=True).rename(columns=COLUMN_NAMES[name])
+
+
+def build_dataset(name):
+    """
+    Returns a dataset with the types used by the dashboard
+    """
+    if name == 'airports':
+        return data_load.upload_airports_data()
+    return data_load.optimize_dtypes(BUILD_FUNCTIONS[name](), data_load.DATASET_DTYPES[name])
+
+
+def get_memory_report(name):
+    """
+    Returns a dataframe with memory usage (in bytes) and type of each
+    column before and after the optimization of a dataset
+    """
+    before = read_raw_dataset(name)
+    after = build_dataset(name)
+    report = pd.DataFrame({
+        'Type Before': before.dtypes.astype(str),
+        'Bytes Before': before.memory_usage(index=False, deep=True),
+        'Type After': after.dtypes.astype(str),
+        'Bytes After': after.memory_usage(index=False, deep=True),
+    }, index=before.columns)
+    report = report.fillna({'Type After': 'dropped', 'Bytes After': 0})
+    report.loc['Total'] = [
+        '', report['Bytes Before'].sum(),
+        '', report['Bytes After'].sum()
+    ]
+    return report.astype({'Bytes Before': int, 'Bytes After': int})
+
+
+def get_airports_read_peak():
+    """
+    Returns the peak of memory (in bytes) allocated while the airport
+    traffic file is read in chunks
+    """
+    data_load.get_dataset('iso_codes')
+    tracemalloc.start()
+    data = data_load.upload_airports_data()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del data
+    return peak
+
+
+if __name__ == '__main__':
+    pd.set_option('display.width', 200)
+    for dataset_name in sys.argv[1:] or DATASETS:
+        print('\n{}'.format(dataset_name))
+        print(get_memory_report(dataset_name).to_string())
+        if dataset_name == 'airports':
+            print('Peak of the chunked read: {:,} bytes'.format(get_airports_read_peak()))
@@ -0,0 +1,197 @@
+import os
+import sys
+import inspect
+import weakref
+import itertools
+import threading
+import functools
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import indexes
+
+# ----- In-process cache of results of the calculations ----- #
+#
+# Results of calculations are kept in memory, least recently used results
+# are dropped once there are more than CACHE_ENTRIES results or they take
+# more than CACHE_BYTES. Arguments are normalized, so that the order of
+# selected names, None and [] or different formats of a date give the same
+# result. Datasets are identified by a number given to every loaded
+# dataset, results of a dataset are dropped once it is replaced
+# (e.g. rows are appended) and the old dataset is released.
+
+CACHE_ENTRIES = int(os.environ.get('RESULT_CACHE_ENTRIES', '512'))
+CACHE_BYTES = int(os.environ.get('RESULT_CACHE_BYTES', str(64 * 1024 * 1024)))
+CACHE_ENABLED = os.environ.get('RESULT_CACHE', '1') != '0'
+
+# Arguments of the calculations with lists of selected names
+# and with dates of the period
+SELECTION_ARGUMENTS = ['states', 'airports', 'area_centers', 'operators', 'entities']
+DATE_ARGUMENTS = ['start_date', 'end_date']
+
+results = OrderedDict()
+dataset_results = {}
+statistics = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+# Reentrant, datasets can be released by the garbage collector
+# (and their results dropped) while the lock is held
+lock = threading.RLock()
+dataset_numbers = itertools.count()
+
+
+def forget_dataset(number):
+    """
+    Drops results calculated from a dataset which no longer exists
+    """
+    with lock:
+        for key in dataset_results.pop(number, ()):
+            remove_result(key)
+
+
+def build_dataset_number(data):
+    number = next(dataset_numbers)
+    weakref.finalize(data, forget_dataset, number)
+    return number
+
+
+def get_dataset_number(data):
+    return indexes.get_index(data, 'result_cache_number', build_dataset_number)
+
+
+def normalize_selection(values):
+    if values is None or len(values) == 0:
+        return None
+    if isinstance(values, str):
+        return (values,)
+    return tuple(sorted(set(values)))
+
+
+def normalize_date(value):
+    if value is None:
+        return None
+    try:
+        return pd.Timestamp(value).isoformat()
+    except (ValueError, TypeError):
+        return str(value)
+
+
+def normalize_argument(name, value, datasets):
+    """
+    Returns a hashable value of an argument of a calculation,
+    numbers of the datasets found in the argument are added to datasets
+    """
+    if isinstance(value, pd.DataFrame):
+        number = get_dataset_number(value)
+        datasets.add(number)
+        return ('dataset', number)
+    if name in SELECTION_ARGUMENTS:
+        return normalize_selection(value)
+    if name in DATE_ARGUMENTS:
+        return normalize_date(value)
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (column, normalize_selection(values)) for column, values in value.items()
+        ))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_argument(None, item, datasets) for item in value)
+    return value
+
+
+def get_result_size(result):
+    """
+    Returns approximate size of a result in bytes
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return int(result.memory_usage(deep=True).sum())
+    if isinstance(result, np.ndarray):
+        return result.nbytes
+    if isinstance(result, tuple):
+        return sum(get_result_size(item) for item in result)
+    return sys.getsizeof(result)
+
+
+def copy_result(result):
+    """
+    Returns a copy of a result, callers add columns to the dataframes
+    they get and must not change the cached ones. Arrays of positions
+    are only read by the callers and are not copied
+    """
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return result.copy()
+    if isinstance(result, tuple):
+        return tuple(copy_result(item) for item in result)
+    return result
+
+
+def remove_result(key):
+    entry = results.pop(key, None)
+    if entry is not None:
+        statistics['bytes'] -= entry[1]
+        for number in entry[2]:
+            keys = dataset_results.get(number)
+            if keys is not None:
+                keys.discard(key)
+
+
+def store_result(key, result, datasets):
+    size = get_result_size(result)
+    if size > CACHE_BYTES:
+        return
+    with lock:
+        remove_result(key)
+        results[key] = (result, size, datasets)
+        statistics['bytes'] += size
+        for number in datasets:
+            dataset_results.setdefault(number, set()).add(key)
+        while len(results) > CACHE_ENTRIES or statistics['bytes'] > CACHE_BYTES:
+            remove_result(next(iter(results)))
+            statistics['evictions'] += 1
+
+
+def memoize(function):
+    """
+    Decorator keeping results of a calculation in the cache
+    """
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not CACHE_ENABLED:
+            return function(*args, **kwargs)
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        datasets = set()
+        key = (function.__qualname__,) + tuple(
+            (name, normalize_argument(name, value, datasets))
+            for name, value in arguments.arguments.items()
+        )
+        with lock:
+            entry = results.get(key)
+            if entry is not None:
+                results.move_to_end(key)
+                statistics['hits'] += 1
+            else:
+                statistics['misses'] += 1
+        if entry is not None:
+            return copy_result(entry[0])
+
+        result = function(*args, **kwargs)
+        store_result(key, result, frozenset(datasets))
+        return copy_result(result)
+
+    return wrapper
+
+
+def get_statistics():
+    """
+    Returns numbers of hits, misses and evictions, number
+    of cached results and their size in bytes
+    """
+    with lock:
+        return dict(statistics, entries=len(results))
+
+
+def clear():
+    with lock:
+        results.clear()
+        dataset_results.clear()
+        statistics['bytes'] = 0
@@ -0,0 +1,45 @@
+"""
+Checks that the vectorized helpers of calculations give the same results
+as the functions applied row by row they replaced.
+
+Usage: python -m pytest test_calculations.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+import constants as c
+import calculations
+
+FLIGHTS = 'Flights'
+
+
+@pytest.mark.parametrize('values', [
+    # thresholds and the values around them
+    [0, 99, 99.5, 100, 100.5, 299, 300, 499, 500, 699, 700, 899, 900, 1099, 1100, 1101],
+    # negative, missing and very large values
+    [-1, np.nan, 1e9, np.inf, -np.inf],
+    np.random.default_rng(0).uniform(-50, 1500, 1000),
+])
+def test_marker_sizes(values):
+    data = pd.DataFrame({FLIGHTS: values})
+    expected = data.apply(calculations.get_marker_size, axis=1, field=FLIGHTS)
+    assert calculations.get_marker_sizes(data[FLIGHTS]).tolist() == expected.tolist()
+
+
+def test_marker_sizes_of_integers():
+    data = pd.DataFrame({FLIGHTS: np.arange(0, 1300, dtype=np.int32)})
+    expected = data.apply(calculations.get_marker_size, axis=1, field=FLIGHTS)
+    assert calculations.get_marker_sizes(data[FLIGHTS]).tolist() == expected.tolist()
+
+
+@pytest.mark.parametrize('dates', [
+    pd.date_range('2019-01-01', '2022-12-31', freq='D'),
+    # first and last days of the months, a leap day and times of a day
+    pd.to_datetime(['2020-01-01', '2020-01-31', '2020-02-29', '2021-12-31 23:59', '2022-12-01 00:01']),
+])
+def test_month_names(dates):
+    data = pd.DataFrame({c.DATE: dates}, index=np.arange(len(dates)) * 2)
+    expected = data.apply(calculations.get_month_name, axis=1)
+    result = calculations.get_month_names(data[c.DATE])
+    assert result.index.equals(data.index)
+    assert result.tolist() == expected.tolist()
@@ -0,0 +1,59 @@
+"""
+Prints memory used by the gunicorn master and each of its workers.
+USS is the memory used by a process only, PSS adds its share of the
+memory pages shared with other processes. Works on Linux only.
+
+Usage: python worker_memory.py <gunicorn master pid>
+"""
+import os
+import sys
+
+MEMORY_FIELDS = {
+    'Rss': 'RSS',
+    'Pss': 'PSS',
+    'Private_Clean': 'USS',
+    'Private_Dirty': 'USS',
+}
+
+
+def get_process_memory(pid):
+    """
+    Returns RSS, PSS and USS of a process in kB
+    """
+    memory = {'RSS': 0, 'PSS': 0, 'USS': 0}
+    with open('/proc/{}/smaps_rollup'.format(pid)) as file:
+        for line in file:
+            field = line.split(':')[0]
+            if field in MEMORY_FIELDS:
+                memory[MEMORY_FIELDS[field]] += int(line.split()[1])
+    return memory
+
+
+def get_child_processes(pid):
+    """
+    Returns ids of the processes started by a process
+    """
+    children = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/{}/stat'.format(entry)) as file:
+                parent_pid = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent_pid == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+if __name__ == '__main__':
+    master_pid = int(sys.argv[1])
+    print('{:>10} {:>8} {:>10} {:>10} {:>10}'.format('', 'pid', 'RSS kB', 'PSS kB', 'USS kB'))
+    processes = [('master', master_pid)]
+    processes += [('worker', pid) for pid in get_child_processes(master_pid)]
+    for role, pid in processes:
+        memory = get_process_memory(pid)
+        print('{:>10} {:>8} {:>10} {:>10} {:>10}'.format(
+            role, pid, memory['RSS'], memory['PSS'], memory['USS']
+        ))